@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = "api"
+
+    def ready(self):
+        # Обработчик connection_created должен видеть и первые соединения.
+        from . import metrics  # noqa: F401
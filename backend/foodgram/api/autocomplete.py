@@ -0,0 +1,76 @@
+import logging
+import threading
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import DatabaseError
+
+from recipe.models import Ingredient
+from recipe.versions import INGREDIENTS, get_version
+from .filters import TRIGRAM_MIN_LENGTH
+
+logger = logging.getLogger(__name__)
+
+
+class IngredientIndex:
+    """
+    Автодополнение ингредиентов в памяти процесса: отсортированный
+    список названий в casefold, префикс ищется через bisect.
+    Перестраивается, когда меняется версия ингредиентов.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.state = None
+
+    def refresh(self):
+        version = get_version(INGREDIENTS)
+        rows = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                "id", "name", "measurement_unit")
+        )
+        keys = [row[0] for row in rows]
+        items = [
+            {"id": pk, "name": name, "measurement_unit": measurement_unit}
+            for _, pk, name, measurement_unit in rows
+        ]
+        self.state = (version, keys, items)
+
+    def warm_up(self):
+        """Строим индекс при старте воркера, если база доступна."""
+        try:
+            self.refresh()
+        except DatabaseError:
+            logger.warning("Индекс ингредиентов не построен при старте.")
+
+    def get_state(self):
+        state = self.state
+        if state is None or state[0] != get_version(INGREDIENTS):
+            with self.lock:
+                state = self.state
+                if state is None or state[0] != get_version(INGREDIENTS):
+                    self.refresh()
+                    state = self.state
+        return state
+
+    def search(self, query, limit):
+        """Сначала совпадения с началом названия, затем вхождения."""
+        _, keys, items = self.get_state()
+        query = query.casefold()
+        result = []
+        for index in range(bisect_left(keys, query), len(keys)):
+            if len(result) >= limit or not keys[index].startswith(query):
+                break
+            result.append(items[index])
+        if (len(result) < limit and settings.INGREDIENT_SEARCH_CONTAINS
+                and len(query) >= TRIGRAM_MIN_LENGTH):
+            for key, item in zip(keys, items):
+                if query in key and not key.startswith(query):
+                    result.append(item)
+                    if len(result) >= limit:
+                        break
+        return result
+
+
+ingredient_index = IngredientIndex()
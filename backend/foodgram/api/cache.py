@@ -0,0 +1,43 @@
+import hashlib
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ResponseCache:
+    """
+    Кэш данных ответа в бэкенде кэша Django. Версии данных входят
+    в ключ, поэтому устаревшие записи просто перестают читаться.
+    Считает попадания и промахи в текущем процессе.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_key(self, *parts):
+        digest = hashlib.md5(repr(parts).encode()).hexdigest()
+        return f"{self.prefix}:{digest}"
+
+    def get(self, key):
+        data = cache.get(key)
+        with self.lock:
+            if data is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return data
+
+    def set(self, key, data):
+        cache.set(key, data, settings.RECIPE_CACHE_TIMEOUT)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+recipe_cache = ResponseCache("recipes")
@@ -1,52 +1,149 @@
+import csv
+import hashlib
 import io
+import json
+import os
 
-from django.db.models import Sum
-from django.http import FileResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.http import FileResponse, StreamingHttpResponse
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
 
-from recipe.models import ShoppingCart
+from recipe.models import IngredientRecipe
+from .metrics import pdf_cache_total, pdf_duration
 
-FILENAME = "shoppingcart.pdf"
+FILENAME = "shoppingcart"
+FONT = "DejaVuSerif"
+CACHE_PREFIX = "shopping_cart_pdf"
+CACHE_TIMEOUT = 60 * 60
+TITLE = "Cписок покупок:"
+EMPTY_TITLE = "Cписок покупок пуст!"
 
+pdfmetrics.registerFont(
+    TTFont(FONT, os.path.join(settings.BASE_DIR, "DejaVuSerif.ttf"), "UTF-8")
+)
 
-def download_shopping_cart(user):
-    """Качаем список покупок."""
-    buffer = io.BytesIO()
-    page = canvas.Canvas(buffer)
-    pdfmetrics.registerFont(TTFont("DejaVuSerif", "DejaVuSerif.ttf", "UTF-8"))
-    x_position, y_position = 50, 800
-    shopping_cart = (
-        ShoppingCart.objects.filter(user=user)
+
+def get_shopping_cart(user):
+    """Суммарное количество каждого ингредиента из списка покупок."""
+    return (
+        IngredientRecipe.objects.filter(recipe__shopping_cart__user=user)
         .values(
-            "recipe__ingredients__name",
-            "recipe__ingredients__measurement_unit",
+            "ingredient_id",
+            name=F("ingredient__name"),
+            measurement_unit=F("ingredient__measurement_unit"),
         )
-        .annotate(amount=Sum("recipe__recipe__amount"))
-        .order_by()
+        .annotate(amount=Sum("amount"))
+        .order_by("name")
     )
-    page.setFont("DejaVuSerif", 14)
+
+
+def format_line(index, ingredient):
+    return (f'{index}. {ingredient["name"]} - {ingredient["amount"]} '
+            f'{ingredient["measurement_unit"]}.')
+
+
+def get_cache_key(user, shopping_cart):
+    """
+    Ключ кэша по содержимому списка: любое изменение корзины
+    или ингредиентов рецептов даёт новый ключ.
+    """
+    content = json.dumps([user.pk, shopping_cart], sort_keys=True,
+                         ensure_ascii=False, default=str)
+    digest = hashlib.sha256(content.encode()).hexdigest()
+    return f"{CACHE_PREFIX}:{user.pk}:{digest}"
+
+
+def render_pdf(shopping_cart):
+    """Рисуем список покупок в PDF."""
+    buffer = io.BytesIO()
+    page = canvas.Canvas(buffer)
+    x_position, y_position = 50, 800
+    page.setFont(FONT, 14)
     if shopping_cart:
         indent = 20
-        page.drawString(x_position, y_position, "Cписок покупок:")
-        for index, recipe in enumerate(shopping_cart, start=1):
-            page.drawString(
-                x_position,
-                y_position - indent,
-                f'{index}. {recipe["recipe__ingredients__name"]} - '
-                f'{recipe["amount"]} '
-                f'{recipe["recipe__ingredients__measurement_unit"]}.',
-            )
+        page.drawString(x_position, y_position, TITLE)
+        for index, ingredient in enumerate(shopping_cart, start=1):
+            page.drawString(x_position, y_position - indent,
+                            format_line(index, ingredient))
             y_position -= 15
             if y_position <= 50:
                 page.showPage()
+                page.setFont(FONT, 14)
                 y_position = 800
-        page.save()
-        buffer.seek(0)
     else:
-        page.setFont("DejaVuSerif", 24)
-        page.drawString(x_position, y_position, "Cписок покупок пуст!")
-        page.save()
-        buffer.seek(0)
-    return FileResponse(buffer, as_attachment=True, filename=FILENAME)
+        page.setFont(FONT, 24)
+        page.drawString(x_position, y_position, EMPTY_TITLE)
+    page.save()
+    return buffer.getvalue()
+
+
+def stream_txt(shopping_cart):
+    yield f"{TITLE}\n"
+    for index, ingredient in enumerate(shopping_cart, start=1):
+        yield f"{format_line(index, ingredient)}\n"
+
+
+class Echo:
+    """Буфер для csv.writer, который просто возвращает строку."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(shopping_cart):
+    writer = csv.writer(Echo())
+    yield writer.writerow(("name", "measurement_unit", "amount"))
+    for ingredient in shopping_cart:
+        yield writer.writerow((ingredient["name"],
+                               ingredient["measurement_unit"],
+                               ingredient["amount"]))
+
+
+def stream_json(shopping_cart):
+    yield "["
+    for index, ingredient in enumerate(shopping_cart):
+        yield ("," if index else "") + json.dumps(ingredient,
+                                                  ensure_ascii=False)
+    yield "]"
+
+
+STREAMS = {
+    "txt": (stream_txt, "text/plain; charset=utf-8"),
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "json": (stream_json, "application/json"),
+}
+
+
+def download_pdf(user):
+    shopping_cart = list(get_shopping_cart(user))
+    key = get_cache_key(user, shopping_cart)
+    pdf = cache.get(key)
+    pdf_cache_total.inc(result="miss" if pdf is None else "hit")
+    if pdf is None:
+        with pdf_duration.time():
+            pdf = render_pdf(shopping_cart)
+        cache.set(key, pdf, CACHE_TIMEOUT)
+    return FileResponse(io.BytesIO(pdf), as_attachment=True,
+                        filename=f"{FILENAME}.pdf")
+
+
+def download_shopping_cart(user, file_format="pdf"):
+    """
+    Качаем список покупок. PDF рисуется целиком и кэшируется,
+    txt/csv/json отдаются потоком прямо из курсора базы.
+    """
+    if file_format not in STREAMS:
+        return download_pdf(user)
+    stream, content_type = STREAMS[file_format]
+    response = StreamingHttpResponse(
+        stream(get_shopping_cart(user).iterator()),
+        content_type=content_type,
+    )
+    response["Content-Disposition"] = (
+        f'attachment; filename="{FILENAME}.{file_format}"'
+    )
+    return response
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from drf_base64.fields import Base64ImageField
+from PIL import Image
+from rest_framework import serializers
+
+from recipe.images import check_dimensions
+
+
+class RecipeImageField(Base64ImageField):
+    """
+    Изображение рецепта: строка base64 или файл из multipart. Объём
+    base64 проверяется до декодирования, размеры картинки — по заголовку
+    файла до того, как ImageField попросит Pillow разобрать картинку.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith("data:"):
+            self.validate_base64_size(data)
+        data = self._decode(data)
+        if hasattr(data, "read"):
+            self.validate_dimensions(data)
+        return super().to_internal_value(data)
+
+    @staticmethod
+    def validate_base64_size(data):
+        size = (len(data) - data.find(",") - 1) * 3 // 4
+        if size > settings.IMAGE_MAX_UPLOAD_SIZE:
+            raise serializers.ValidationError(
+                f"Файл больше {settings.IMAGE_MAX_UPLOAD_SIZE} байт."
+            )
+
+    @staticmethod
+    def validate_dimensions(file):
+        try:
+            with Image.open(file) as image:
+                check_dimensions(image)
+        except ValidationError as error:
+            raise serializers.ValidationError(error.messages)
+        except Image.DecompressionBombError as error:
+            raise serializers.ValidationError(str(error))
+        except (OSError, ValueError):
+            # Не картинка: стандартную ошибку вернёт ImageField.
+            pass
+        finally:
+            file.seek(0)
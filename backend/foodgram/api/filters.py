@@ -1,12 +1,40 @@
 import django_filters as filters
+from django.conf import settings
+from django.db.models import Case, IntegerField, Value, When
+from django.db.models.functions import Lower
+from rest_framework.filters import OrderingFilter
 
 from recipe.models import Ingredient, Recipe, User
 
+TRIGRAM_MIN_LENGTH = 3
+
 
 class IngredientFilter(filters.FilterSet):
-    """Фильтрация ингридиентов"""
+    """
+    Поиск ингридиентов по lower(name): сначала совпадения с началом
+    названия, затем вхождения в середину. Оба варианта используют
+    индексы из миграции 0003 (на PostgreSQL).
+    """
+
+    name = filters.CharFilter(method="search_name")
 
-    name = filters.CharFilter(lookup_expr="istartswith")
+    @staticmethod
+    def search_name(queryset, name, value):
+        value = value.lower()
+        queryset = queryset.annotate(name_lower=Lower("name"))
+        if (not settings.INGREDIENT_SEARCH_CONTAINS
+                or len(value) < TRIGRAM_MIN_LENGTH):
+            queryset = queryset.filter(
+                name_lower__startswith=value).order_by("name_lower")
+        else:
+            queryset = queryset.filter(name_lower__contains=value).annotate(
+                rank=Case(
+                    When(name_lower__startswith=value, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                )
+            ).order_by("rank", "name_lower")
+        return queryset
 
     class Meta:
         model = Ingredient
@@ -47,3 +75,21 @@ class RecipeFilter(filters.FilterSet):
     class Meta:
         model = Recipe
         fields = ["is_favorited", "is_in_shopping_cart", "author", "tags"]
+
+
+class RecipeOrderingFilter(OrderingFilter):
+    """
+    ?ordering=-created|-popularity|cooking_time. Каждому варианту
+    соответствует индекс из миграции 0005; id в конце делает порядок
+    однозначным для keyset-пагинации.
+    """
+
+    orderings = {
+        "-created": ("-created", "-id"),
+        "-popularity": ("-favorites_count", "-id"),
+        "cooking_time": ("cooking_time", "id"),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.orderings.get(request.query_params.get(
+            self.ordering_param))
@@ -0,0 +1,290 @@
+import json
+import time
+from collections import namedtuple
+from urllib.parse import unquote, urlencode
+
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLResolver, reverse
+from rest_framework.authtoken.models import Token
+
+from api import urls as api_urls
+from recipe.management.commands.generate_dataset import PASSWORD
+from recipe.models import Follow, Ingredient, Recipe, Tag, User
+
+Step = namedtuple("Step", "name method url data anonymous",
+                  defaults=(None, False))
+
+# Смена почты и пароля по письму, активация: в проекте не используются.
+# user-set-password перекрыт маршрутом set_password с тем же адресом.
+SKIPPED_ROUTES = {
+    "user-activation", "user-resend-activation", "user-reset-password",
+    "user-reset-password-confirm", "user-reset-username",
+    "user-reset-username-confirm", "user-set-username", "user-set-password",
+}
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA"
+    "DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+
+def percentile(values, share):
+    """Ближайший ранг: для десятков замеров точнее интерполяции не надо."""
+    values = sorted(values)
+    return values[min(len(values) - 1, round(share * (len(values) - 1)))]
+
+
+def route_names(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from route_names(pattern.url_patterns)
+        elif pattern.name:
+            yield pattern.name
+
+
+class Command(BaseCommand):
+    help = (
+        "Замер всех маршрутов api/urls.py тестовым клиентом Django на "
+        "текущей базе (данные — generate_dataset): p50/p95 времени и "
+        "число запросов к БД. Записи откатываются. --output сохраняет "
+        "результат в JSON, --compare сравнивает с прошлым прогоном"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=20)
+        parser.add_argument("--user", help="Email пользователя для замера")
+        parser.add_argument("--output", help="Сохранить результат в JSON")
+        parser.add_argument("--compare", help="JSON прошлого прогона")
+
+    def handle(self, *args, **options):
+        with override_settings(ALLOWED_HOSTS=["testserver"]), \
+                transaction.atomic():
+            context = self.get_context(options["user"])
+            steps = self.get_steps(context)
+            self.check_coverage(steps)
+            results = self.run(steps, options["repeat"], context["token"])
+            transaction.set_rollback(True)
+        self.report(results, options["compare"])
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+
+    def get_context(self, email):
+        """
+        Пользователь с самой большой корзиной, самые популярные рецепты
+        не из его избранного и корзины, автор, на которого он ещё не
+        подписан.
+        """
+        users = User.objects.annotate(carts=Count("shopping_cart"))
+        user = (users.filter(email=email) if email
+                else users.order_by("-carts", "pk")).first()
+        if user is None:
+            raise CommandError(
+                "Нет данных для замера, запустите generate_dataset")
+        recipes = list(
+            Recipe.objects.exclude(recipe_favorite__user=user)
+            .exclude(shopping_cart__user=user)
+            .order_by("-favorites_count", "-id")
+            .values_list("pk", flat=True)[:6]
+        )
+        if not recipes:
+            raise CommandError(
+                "Нет данных для замера, запустите generate_dataset")
+        author = (
+            User.objects.exclude(pk=user.pk)
+            .exclude(following__user=user).order_by("pk").first()
+        )
+        follow = Follow.objects.filter(user=user).order_by("pk").first()
+        return {
+            "user": user,
+            "token": Token.objects.get_or_create(user=user)[0].key,
+            "recipe": recipes[0],
+            "recipes": recipes[1:] or recipes,
+            "author": author.pk if author else user.pk,
+            "follow": follow.pk if follow else 0,
+            "tag": Tag.objects.order_by("pk").values_list(
+                "slug", "pk").first() or ("", 0),
+            "ingredient": Ingredient.objects.order_by("pk").values_list(
+                "name", "pk").first() or ("", 0),
+        }
+
+    def get_steps(self, context):
+        """
+        Сценарии по очереди: каждая запись сразу отменяется следующим
+        шагом, поэтому повторы замеряют одно и то же.
+        """
+        recipe, author = context["recipe"], context["author"]
+        tag_slug, tag = context["tag"]
+        ingredient_name, ingredient = context["ingredient"]
+        ids = {"recipes": context["recipes"]}
+        passwords = {"current_password": PASSWORD, "new_password": PASSWORD}
+        authors = {"authors": [author]}
+        new_recipe = {
+            "name": "Замер", "text": "Замер", "cooking_time": 10,
+            "image": IMAGE, "tags": [tag],
+            "ingredients": [{"id": ingredient, "amount": 1}],
+        }
+        return [
+            Step("api-root", "get", reverse("api:api-root")),
+            Step("recipes-list", "get", reverse("api:recipes-list"),
+                 anonymous=True),
+            Step("recipes-list", "get", reverse("api:recipes-list")),
+            Step("recipes-list", "get", reverse("api:recipes-list")
+                 + f"?tags={tag_slug}&is_favorited=1"),
+            Step("recipes-list", "get", reverse("api:recipes-list")
+                 + "?ordering=-popularity&pagination=cursor"),
+            Step("recipes-detail", "get",
+                 reverse("api:recipes-detail", args=[recipe])),
+            Step("recipes-feed", "get", reverse("api:recipes-feed")),
+            Step("recipes-download-shopping-cart", "get",
+                 reverse("api:recipes-download-shopping-cart")),
+            Step("recipes-favorite", "post",
+                 reverse("api:recipes-favorite", args=[recipe])),
+            Step("recipes-favorite", "delete",
+                 reverse("api:recipes-favorite", args=[recipe])),
+            Step("recipes-shopping-cart", "post",
+                 reverse("api:recipes-shopping-cart", args=[recipe])),
+            Step("recipes-shopping-cart", "delete",
+                 reverse("api:recipes-shopping-cart", args=[recipe])),
+            Step("recipes-favorite-bulk", "post",
+                 reverse("api:recipes-favorite-bulk"), ids),
+            Step("recipes-favorite-bulk", "delete",
+                 reverse("api:recipes-favorite-bulk"), ids),
+            Step("recipes-shopping-cart-bulk", "post",
+                 reverse("api:recipes-shopping-cart-bulk"), ids),
+            Step("recipes-shopping-cart-bulk", "delete",
+                 reverse("api:recipes-shopping-cart-bulk"), ids),
+            Step("recipes-list", "post", reverse("api:recipes-list"),
+                 new_recipe),
+            Step("recipes-detail", "patch",
+                 reverse("api:recipes-detail", args=["{created}"]),
+                 {**new_recipe, "name": "Замер 2"}),
+            Step("recipes-detail", "delete",
+                 reverse("api:recipes-detail", args=["{created}"])),
+            Step("tags-list", "get", reverse("api:tags-list")),
+            Step("tags-detail", "get", reverse("api:tags-detail",
+                                               args=[tag])),
+            Step("ingredient-list", "get", reverse("api:ingredient-list")
+                 + "?" + urlencode({"name": ingredient_name[:2]})),
+            Step("ingredient-detail", "get",
+                 reverse("api:ingredient-detail", args=[ingredient])),
+            Step("user-list", "get", reverse("api:user-list")),
+            Step("user-detail", "get",
+                 reverse("api:user-detail", args=[author])),
+            Step("user-me", "get", reverse("api:user-me")),
+            Step("follow-list", "get", reverse("api:follow-list")),
+            Step("follow-detail", "get",
+                 reverse("api:follow-detail", args=[context["follow"]])),
+            Step("user-subscribe", "post",
+                 reverse("api:user-subscribe", args=[author])),
+            Step("user-subscribe", "delete",
+                 reverse("api:user-subscribe", args=[author])),
+            Step("user-subscribe-bulk", "post",
+                 reverse("api:user-subscribe-bulk"), authors),
+            Step("user-subscribe-bulk", "delete",
+                 reverse("api:user-subscribe-bulk"), authors),
+            Step("set_password", "post", reverse("api:set_password"),
+                 passwords),
+            Step("user-list", "post", reverse("api:user-list"),
+                 {"email": "bench-{iteration}@example.com",
+                  "username": "bench-{iteration}", "first_name": "Замер",
+                  "last_name": "Замер", "password": PASSWORD}, True),
+            # Выход удаляет токен, вход выдаёт новый: они идут последними.
+            Step("logout", "post", reverse("api:logout")),
+            Step("login", "post", reverse("api:login"),
+                 {"email": context["user"].email, "password": PASSWORD},
+                 True),
+        ]
+
+    def check_coverage(self, steps):
+        missing = (set(route_names(api_urls.urlpatterns)) - SKIPPED_ROUTES
+                   - {step.name for step in steps})
+        if missing:
+            self.stderr.write(f"Без замера: {', '.join(sorted(missing))}")
+
+    @staticmethod
+    def fill(text, state):
+        for name, value in state.items():
+            text = text.replace(f"{{{name}}}", str(value))
+            text = text.replace(f"%7B{name}%7D", str(value))
+        return text
+
+    def request(self, step, state):
+        """
+        Один запрос. Из ответа запоминаются id созданного объекта и новый
+        токен: на них ссылаются следующие шаги сценария.
+        """
+        headers = ({} if step.anonymous
+                   else {"HTTP_AUTHORIZATION": f"Token {state['token']}"})
+        data = "" if step.data is None else json.dumps(step.data)
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = getattr(Client(**headers), step.method)(
+                self.fill(step.url, state), self.fill(data, state),
+                content_type="application/json")
+            if response.streaming:
+                # Файл отдаётся потоком: время формирования тоже считаем.
+                b"".join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if (response.status_code in (200, 201)
+                and response.get("Content-Type") == "application/json"
+                and response.content):
+            body = response.json()
+            if isinstance(body, dict):
+                if response.status_code == 201:
+                    state["created"] = body.get("id", state["created"])
+                state["token"] = body.get("auth_token", state["token"])
+        return response.status_code, elapsed, len(queries)
+
+    def run(self, steps, repeat, token):
+        state = {"token": token, "created": 0}
+        samples = {}
+        for iteration in range(repeat):
+            state["iteration"] = iteration
+            for step in steps:
+                status, elapsed, queries = self.request(step, state)
+                key = f"{step.method.upper()} {unquote(step.url)}"
+                if step.anonymous:
+                    key += " (аноним)"
+                sample = samples.setdefault(
+                    key, {"timings": [], "queries": [], "statuses": set()})
+                sample["timings"].append(elapsed)
+                sample["queries"].append(queries)
+                sample["statuses"].add(status)
+        return {
+            key: {
+                "p50_ms": round(percentile(sample["timings"], 0.5) * 1000, 2),
+                "p95_ms": round(
+                    percentile(sample["timings"], 0.95) * 1000, 2),
+                "queries": percentile(sample["queries"], 0.5),
+                "max_queries": max(sample["queries"]),
+                "statuses": sorted(sample["statuses"]),
+            }
+            for key, sample in samples.items()
+        }
+
+    def report(self, results, compare):
+        previous = {}
+        if compare:
+            with open(compare, encoding="utf-8") as file:
+                previous = json.load(file)
+        for key, result in results.items():
+            line = (
+                f"{key:<60} p50 {result['p50_ms']:>8.2f} мс  "
+                f"p95 {result['p95_ms']:>8.2f} мс  "
+                f"запросов {result['queries']:>3} "
+                f"(макс. {result['max_queries']})  "
+                f"{','.join(map(str, result['statuses']))}"
+            )
+            old = previous.get(key)
+            if old:
+                line += (
+                    f"  было p50 {old['p50_ms']:.2f} мс, "
+                    f"запросов {old['queries']}"
+                )
+            style = (self.style.ERROR if max(result["statuses"]) >= 400
+                     else str)
+            self.stdout.write(style(line))
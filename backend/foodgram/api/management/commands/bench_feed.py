@@ -0,0 +1,98 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from recipe import feed
+from recipe.models import FeedItem, Follow, Recipe, User
+
+PREFIX = "bench-feed"
+
+
+class Command(BaseCommand):
+    help = ("Замер ленты подписок (fan-out on write) на синтетических "
+            "данных. Все данные создаются в транзакции и откатываются.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--authors", type=int, default=3)
+        parser.add_argument("--followers", type=int, default=10000,
+                            help="Подписчиков у каждого автора")
+        parser.add_argument("--recipes", type=int, default=20,
+                            help="Рецептов у каждого автора до замера")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def timed(self, name, function, *args):
+        start = time.perf_counter()
+        result = function(*args)
+        self.stdout.write(
+            f"{name}: {(time.perf_counter() - start) * 1000:.1f} мс")
+        return result
+
+    def create_users(self, kind, count):
+        User.objects.bulk_create(
+            User(username=f"{PREFIX}-{kind}-{index}",
+                 email=f"{PREFIX}-{kind}-{index}@example.com")
+            for index in range(count)
+        )
+        return list(
+            User.objects.filter(username__startswith=f"{PREFIX}-{kind}-")
+            .values_list("pk", flat=True)
+        )
+
+    def create_data(self, options):
+        authors = self.create_users("author", options["authors"])
+        followers = self.create_users("follower", options["followers"])
+        Recipe.objects.bulk_create(
+            Recipe(name=f"{PREFIX}-{index}", author_id=author, text=PREFIX,
+                   cooking_time=1)
+            for author in authors
+            for index in range(options["recipes"])
+        )
+        follows = [(follower, author)
+                   for author in authors for follower in followers]
+        for batch in feed.chunks(follows, feed.BATCH_SIZE * 10):
+            Follow.objects.bulk_create(
+                Follow(user_id=user, author_id=author)
+                for user, author in batch
+            )
+        self.timed(f"Наполнение лент ({len(follows)} подписок)",
+                   feed.backfill, follows)
+        return authors, followers
+
+    def measure(self, name, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            list(queryset.all())
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        self.stdout.write(
+            f"{name}: медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс"
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            authors, followers = self.create_data(options)
+            recipe = Recipe.objects.create(
+                name=f"{PREFIX}-new", author_id=authors[0], text=PREFIX,
+                cooking_time=1)
+            self.timed(f"Fan-out нового рецепта на {len(followers)} "
+                       f"подписчиков", feed.fan_out, recipe)
+            user = followers[0]
+            self.stdout.write(
+                f"Записей в ленте: "
+                f"{FeedItem.objects.filter(user_id=user).count()}")
+            self.measure(
+                "Первая страница из FeedItem",
+                FeedItem.objects.filter(user_id=user)
+                .order_by("-created", "-recipe_id")[:6],
+                options["repeat"],
+            )
+            self.measure(
+                "Первая страница через JOIN подписок",
+                Recipe.objects.filter(author__following__user_id=user)
+                .order_by("-created", "-id")[:6],
+                options["repeat"],
+            )
+            transaction.set_rollback(True)
@@ -0,0 +1,91 @@
+import time
+
+from django.core.management import BaseCommand
+from django.db import transaction
+from django.db.models import Sum
+
+from api.download_shopping_cart import get_shopping_cart
+from recipe.models import (Ingredient, IngredientRecipe, Recipe,
+                           ShoppingCart, User)
+
+PREFIX = "bench-shopping-cart"
+
+
+class Command(BaseCommand):
+    help = ("Замер агрегации списка покупок на синтетических данных. "
+            "Все данные создаются в транзакции и откатываются.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--recipes", type=int, default=500)
+        parser.add_argument("--ingredients", type=int, default=10,
+                            help="Ингредиентов в каждом рецепте")
+        parser.add_argument("--repeat", type=int, default=20)
+
+    @staticmethod
+    def legacy_query(user):
+        """Прежняя агрегация через ShoppingCart, для сравнения."""
+        return (
+            ShoppingCart.objects.filter(user=user)
+            .values("recipe__ingredients__name",
+                    "recipe__ingredients__measurement_unit")
+            .annotate(amount=Sum("recipe__recipe__amount"))
+            .order_by()
+        )
+
+    def create_data(self, recipes_count, ingredients_count):
+        user = User.objects.create(username=PREFIX,
+                                   email=f"{PREFIX}@example.com")
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"{PREFIX}-{index}", measurement_unit="г")
+            for index in range(ingredients_count * 5)
+        )
+        ingredients = list(
+            Ingredient.objects.filter(name__startswith=PREFIX)
+            .values_list("pk", flat=True)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(name=f"{PREFIX}-{index}", author=user, text=PREFIX,
+                   cooking_time=1)
+            for index in range(recipes_count)
+        )
+        recipes = list(
+            Recipe.objects.filter(author=user).values_list("pk", flat=True)
+        )
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
+                recipe_id=recipe,
+                ingredient_id=ingredients[(index + shift) % len(ingredients)],
+                amount=shift + 1,
+            )
+            for index, recipe in enumerate(recipes)
+            for shift in range(ingredients_count)
+        )
+        ShoppingCart.objects.bulk_create(
+            ShoppingCart(user=user, recipe_id=recipe) for recipe in recipes
+        )
+        return user
+
+    def measure(self, name, queryset, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            rows = list(queryset.all())
+            timings.append(time.perf_counter() - start)
+        timings.sort()
+        total = sum(row["amount"] or 0 for row in rows)
+        self.stdout.write(
+            f"{name}: строк {len(rows)}, сумма {total}, "
+            f"медиана {timings[len(timings) // 2] * 1000:.2f} мс, "
+            f"максимум {timings[-1] * 1000:.2f} мс"
+        )
+        self.stdout.write(queryset.explain())
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.create_data(options["recipes"],
+                                    options["ingredients"])
+            self.measure("Прежний запрос", self.legacy_query(user),
+                         options["repeat"])
+            self.measure("get_shopping_cart", get_shopping_cart(user),
+                         options["repeat"])
+            transaction.set_rollback(True)
@@ -0,0 +1,257 @@
+import hmac
+import threading
+import time
+import weakref
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, HttpResponseForbidden
+
+from recipe.models import Follow, Recipe, User
+from .cache import recipe_cache
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+registry = []
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    pairs = ",".join(
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\")
+                         .replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in labels
+    )
+    return f"{{{pairs}}}"
+
+
+def format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class Metric:
+    """
+    Метрика в памяти процесса, формат — текстовый Prometheus. У
+    каждого воркера gunicorn свои значения: Prometheus собирает их с
+    каждого процесса, суммирует запрос sum().
+    """
+
+    kind = None
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self.lock = threading.Lock()
+        registry.append(self)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} {self.kind}"
+        for suffix, labels, value in self.samples():
+            yield (f"{self.name}{suffix}{format_labels(labels)} "
+                   f"{format_value(value)}")
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        super().__init__(name, documentation)
+        self.values = defaultdict(float)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[key] += amount
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            yield "", labels, value
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DURATION_BUCKETS):
+        super().__init__(name, documentation)
+        self.buckets = (*buckets, float("inf"))
+        self.values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            counts, total = self.values.get(
+                key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self.lock:
+            values = [(key, list(counts), total)
+                      for key, (counts, total) in self.values.items()]
+        for labels, counts, total in values:
+            for bound, count in zip(self.buckets, counts):
+                yield "_bucket", (*labels, ("le", format_value(bound))), count
+            yield "_sum", labels, total
+            yield "_count", labels, counts[-1]
+
+
+class Gauge(Metric):
+    """Значение считается при каждом сборе функцией collect."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, collect):
+        super().__init__(name, documentation)
+        self.collect = collect
+
+    def samples(self):
+        for labels, value in self.collect():
+            yield "", tuple(sorted(labels.items())), value
+
+
+class CollectedCounter(Gauge):
+    """Счётчик, который ведётся в другом месте (например, ResponseCache)."""
+
+    kind = "counter"
+
+
+requests_total = Counter(
+    "foodgram_requests_total", "Запросы к API по view и коду ответа.")
+request_duration = Histogram(
+    "foodgram_request_duration_seconds", "Время ответа API по view.")
+db_queries_total = Counter(
+    "foodgram_db_queries_total",
+    "Запросы к БД по view (только для замеренных запросов).")
+db_duration_total = Counter(
+    "foodgram_db_duration_seconds_total",
+    "Время запросов к БД по view (только для замеренных запросов).")
+db_connections_total = Counter(
+    "foodgram_db_connections_created_total",
+    "Новые соединения с БД; быстрый рост — соединения не "
+    "переиспользуются (CONN_MAX_AGE).")
+pdf_duration = Histogram(
+    "foodgram_shopping_cart_pdf_seconds",
+    "Время рисования PDF списка покупок (промахи кэша).")
+pdf_cache_total = Counter(
+    "foodgram_shopping_cart_pdf_cache_total",
+    "Обращения к кэшу PDF списка покупок по результату.")
+
+
+def collect_cache():
+    for result, value in (("hit", recipe_cache.hits),
+                          ("miss", recipe_cache.misses)):
+        yield {"cache": recipe_cache.prefix, "result": result}, value
+
+
+def collect_cache_ratio():
+    yield {"cache": recipe_cache.prefix}, recipe_cache.hit_ratio
+
+
+# Обёртки соединений всех потоков процесса: connections в Django у
+# каждого потока свои. Обёртка умирающего потока уходит из набора сама.
+wrappers = weakref.WeakSet()
+wrappers_lock = threading.Lock()
+
+
+def collect_connections():
+    """Открытые соединения с БД во всех потоках процесса."""
+    with wrappers_lock:
+        known = list(wrappers)
+    opened = defaultdict(int)
+    for wrapper in known:
+        opened[wrapper.alias] += wrapper.connection is not None
+    for alias, value in opened.items():
+        yield {"alias": alias}, value
+
+
+class DomainCounts:
+    """
+    COUNT(*) по большим таблицам на каждый сбор Prometheus — лишняя
+    нагрузка на базу: значения пересчитываются не чаще раза в
+    METRICS_OBJECTS_TTL секунд.
+    """
+
+    models = (("recipes", Recipe), ("users", User), ("follows", Follow))
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.updated = None
+        self.values = []
+
+    def __call__(self):
+        with self.lock:
+            now = time.monotonic()
+            if (self.updated is None
+                    or now - self.updated >= settings.METRICS_OBJECTS_TTL):
+                self.values = [({"object": name}, model.objects.count())
+                               for name, model in self.models]
+                self.updated = now
+            return list(self.values)
+
+
+CollectedCounter("foodgram_response_cache_requests_total",
+                 "Обращения к кэшу ответов по результату.", collect_cache)
+Gauge("foodgram_response_cache_hit_ratio",
+      "Доля попаданий в кэш ответов.", collect_cache_ratio)
+Gauge("foodgram_db_connections_open",
+      "Открытые соединения с БД во всех потоках процесса.",
+      collect_connections)
+Gauge("foodgram_objects",
+      "Число объектов в базе (с задержкой до METRICS_OBJECTS_TTL).",
+      DomainCounts())
+
+
+def count_connection(sender, connection, **kwargs):
+    db_connections_total.inc(alias=connection.alias,
+                             vendor=connection.vendor)
+    with wrappers_lock:
+        wrappers.add(connection)
+
+
+connection_created.connect(count_connection)
+
+
+def render():
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def has_access(request):
+    """Заголовок Authorization: Bearer <METRICS_TOKEN> или сотрудник."""
+    token = settings.METRICS_TOKEN
+    if token and hmac.compare_digest(
+            request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return True
+    return request.user.is_staff
+
+
+def metrics_view(request):
+    """
+    /metrics в текстовом формате Prometheus. По умолчанию закрыт:
+    Prometheus ходит с METRICS_TOKEN, сотрудники — со своей сессией.
+    """
+    if not has_access(request):
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
@@ -0,0 +1,126 @@
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics as prometheus
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar("current_metrics", default=None)
+
+
+class RequestMetrics:
+    """Счётчики одного запроса; сам объект — обёртка execute для БД."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.render_time = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+def get_view_name(view_func, method):
+    """RecipesViewSet.list для viewset, имя функции для @api_view."""
+    view = getattr(view_func, "cls", None)
+    if view is None:
+        return view_func.__name__
+    actions = getattr(view_func, "actions", None) or {}
+    return f"{view.__name__}.{actions.get(method.lower(), method.lower())}"
+
+
+class RequestMetricsMiddleware:
+    """
+    Число и время всех запросов уходят в метрики /metrics. Для доли
+    REQUEST_METRICS_SAMPLE_RATE ещё считаются запросы к БД, их время,
+    время рендеринга JSON (TimedJSONRenderer) и размер ответа: итог
+    строкой JSON уходит в лог на уровне DEBUG, больше
+    REQUEST_QUERY_THRESHOLD запросов — предупреждение. Заголовок
+    Server-Timing с теми же цифрами получают только в DEBUG и сотрудники.
+    Потоковый ответ читает базу уже после выхода из middleware: такой
+    запрос помечается неизмеренным.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        if random.random() >= settings.REQUEST_METRICS_SAMPLE_RATE:
+            response = self.get_response(request)
+            self.count(request, response, time.perf_counter() - start)
+            return response
+        metrics = RequestMetrics()
+        token = current_metrics.set(metrics)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(metrics))
+                response = self.get_response(request)
+        finally:
+            current_metrics.reset(token)
+        total = time.perf_counter() - start
+        self.count(request, response, total)
+        self.report(request, response, metrics, total)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request.view_name = get_view_name(view_func, request.method)
+
+    @staticmethod
+    def show_timing(request):
+        user = getattr(request, "user", None)
+        return settings.DEBUG or bool(user and user.is_staff)
+
+    @staticmethod
+    def count(request, response, total):
+        view = getattr(request, "view_name", "unresolved")
+        prometheus.requests_total.inc(view=view, method=request.method,
+                                      status=response.status_code)
+        prometheus.request_duration.observe(total, view=view)
+
+    def report(self, request, response, metrics, total):
+        view = getattr(request, "view_name", "unresolved")
+        record = {
+            "view": view,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "total_ms": round(total * 1000, 2),
+        }
+        if response.streaming:
+            record["measured"] = False
+            logger.debug(json.dumps(record, ensure_ascii=False))
+            return
+        prometheus.db_queries_total.inc(metrics.queries, view=view)
+        prometheus.db_duration_total.inc(metrics.db_time, view=view)
+        if self.show_timing(request):
+            response["Server-Timing"] = (
+                f'db;dur={metrics.db_time * 1000:.1f};'
+                f'desc="{metrics.queries} queries", '
+                f"render;dur={metrics.render_time * 1000:.1f}, "
+                f"total;dur={total * 1000:.1f}"
+            )
+        record.update({
+            "queries": metrics.queries,
+            "db_ms": round(metrics.db_time * 1000, 2),
+            "render_ms": round(metrics.render_time * 1000, 2),
+            "size": len(response.content),
+        })
+        if metrics.queries > settings.REQUEST_QUERY_THRESHOLD:
+            record["alarm"] = "too_many_queries"
+            logger.warning(json.dumps(record, ensure_ascii=False))
+        else:
+            logger.debug(json.dumps(record, ensure_ascii=False))
@@ -0,0 +1,106 @@
+import hashlib
+import json
+
+from django.conf import settings
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from recipe.versions import (INGREDIENTS, RECIPES, TAGS, get_version,
+                             get_versions, recipe_version)
+from .cache import recipe_cache
+
+
+class VersionETagMixin:
+    """
+    Условный GET для справочников: ETag строится из версии данных,
+    которая меняется при сохранении и удалении. Если клиент прислал
+    тот же ETag в If-None-Match, отвечаем 304 без запросов к базе.
+    """
+
+    version_name = None
+
+    def get_etag(self, request):
+        """
+        Версия данных плюс то, что выбирает ответ: action, pk и
+        нормализованные параметры запроса. ETag списка не подходит ни
+        к карточке, ни к поиску ?name=.
+        """
+        version = get_version(self.version_name)
+        scope = json.dumps([
+            self.action,
+            self.kwargs.get(self.lookup_url_kwarg or self.lookup_field),
+            sorted((name, sorted(values))
+                   for name, values in request.query_params.lists()),
+        ], ensure_ascii=False)
+        digest = hashlib.sha1(scope.encode()).hexdigest()[:16]
+        return (f'"{self.version_name}-{version}-'
+                f'{request.accepted_renderer.format}-{digest}"')
+
+    def conditional(self, handler, request, *args, **kwargs):
+        etag = self.get_etag(request)
+        if etag in parse_etags(request.headers.get("If-None-Match", "")):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (status.HTTP_200_OK,
+                                    status.HTTP_304_NOT_MODIFIED):
+            response["ETag"] = etag
+            patch_cache_control(response, public=True,
+                                max_age=settings.REFERENCE_DATA_MAX_AGE)
+        return response
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional(super().retrieve, request, *args, **kwargs)
+
+
+class AnonymousRecipeCacheMixin:
+    """
+    Кэш списка и карточки рецепта для анонимных пользователей: их ответ
+    не зависит от пользователя. Ключ включает все параметры запроса
+    (имена и значения отсортированы, повторы значений убраны) и версии
+    рецептов, тэгов и ингредиентов.
+    """
+
+    def get_cache_parts(self, request):
+        params = tuple(sorted(
+            (name, tuple(sorted(set(values))))
+            for name, values in request.query_params.lists()
+        ))
+        return (request.get_host(), request.accepted_renderer.format, params)
+
+    def cached(self, handler, key, request, *args, **kwargs):
+        data = recipe_cache.get(key)
+        if data is not None:
+            response = Response(data)
+            response["X-Cache"] = "HIT"
+            return response
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            recipe_cache.set(key, response.data)
+        response["X-Cache"] = "MISS"
+        return response
+
+    def list(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().list(request, *args, **kwargs)
+        key = recipe_cache.get_key(
+            "list", get_versions(RECIPES, TAGS, INGREDIENTS),
+            self.get_cache_parts(request),
+        )
+        return self.cached(super().list, key, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.user.is_authenticated:
+            return super().retrieve(request, *args, **kwargs)
+        pk = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        key = recipe_cache.get_key(
+            "detail", pk,
+            get_versions(recipe_version(pk), TAGS, INGREDIENTS),
+            self.get_cache_parts(request),
+        )
+        return self.cached(super().retrieve, key, request, *args, **kwargs)
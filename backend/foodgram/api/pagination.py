@@ -1,6 +1,130 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import datetime
+import json
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder обрезает время до миллисекунд: записи из одной
+    миллисекунды после такого курсора терялись бы. Здесь — с
+    микросекундами, фильтр по полю разбирает строку обратно точно.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
 
 
 class LimitPageNumberPagination(PageNumberPagination):
     page_size = 6
     page_size_query_param = "limit"
+
+
+class SearchLimitPagination(BasePagination):
+    """
+    Список без страниц; при поиске ?name= — только первые
+    INGREDIENT_SEARCH_LIMIT совпадений. Срез делается здесь, а не в
+    фильтре: фильтр применяется и в retrieve, где срез ломает get().
+    """
+
+    search_param = "name"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if not request.query_params.get(self.search_param):
+            return None
+        return list(queryset[:settings.INGREDIENT_SEARCH_LIMIT])
+
+    def get_paginated_response(self, data):
+        return Response(data)
+
+
+class KeysetPagination(LimitPageNumberPagination):
+    """
+    Keyset-пагинация: курсор хранит значения полей сортировки последней
+    записи, следующая страница выбирается условием по этим полям, а не
+    OFFSET, поэтому стоит одинаково на любой глубине и не считает COUNT.
+    Сортировка берётся из queryset и должна заканчиваться уникальным
+    полем (id), иначе записи с равными значениями потеряются.
+    """
+
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Неверный курсор."
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        values = self.decode_cursor(request)
+        if values is not None:
+            queryset = queryset.filter(self.get_keyset_filter(values))
+        page = list(queryset.order_by(*self.ordering)[:page_size + 1])
+        self.has_next = len(page) > page_size
+        page = page[:page_size]
+        self.last = page[-1] if page else None
+        return page
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        assert all(isinstance(field, str) for field in ordering), (
+            "Keyset-пагинация работает только с сортировкой по полям."
+        )
+        return tuple(ordering)
+
+    def get_keyset_filter(self, values):
+        """
+        (a, b) после (x, y) — это a > x ИЛИ (a = x И b > y),
+        с учётом направления сортировки каждого поля.
+        """
+        keyset_filter = Q()
+        equal = {}
+        for field, value in zip(self.ordering, values):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            keyset_filter |= Q(**equal, **{f"{name}__{lookup}": value})
+            equal[name] = value
+        return keyset_filter
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+        except (binascii.Error, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    def encode_cursor(self, obj):
+        values = [getattr(obj, field.lstrip("-")) for field in self.ordering]
+        content = json.dumps(values, cls=CursorEncoder)
+        return base64.urlsafe_b64encode(content.encode()).decode()
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = remove_query_param(self.request.build_absolute_uri(),
+                                 self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param,
+                                   self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ("next", self.get_next_link()),
+            ("results", data),
+        ]))
@@ -0,0 +1,54 @@
+import json
+import time
+
+from rest_framework import renderers
+
+from .middleware import current_metrics
+
+
+class TimedJSONRenderer(renderers.JSONRenderer):
+    """
+    JSONRenderer, время которого попадает в замер запроса
+    RequestMetricsMiddleware (render в Server-Timing и логе).
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        metrics = current_metrics.get()
+        if metrics is None:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        start = time.perf_counter()
+        try:
+            return super().render(data, accepted_media_type,
+                                  renderer_context)
+        finally:
+            metrics.render_time += time.perf_counter() - start
+
+
+class ShoppingListRenderer(renderers.BaseRenderer):
+    """
+    Файл списка покупок формирует сама view, рендереры нужны только
+    чтобы DRF принимал ?format=txt|csv|pdf. Ошибки view переключает на
+    JSONRenderer; render здесь — запасной путь.
+    """
+
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data, ensure_ascii=False).encode("utf-8")
+
+
+class PDFRenderer(ShoppingListRenderer):
+    media_type = "application/pdf"
+    format = "pdf"
+    charset = None
+
+
+class PlainTextRenderer(ShoppingListRenderer):
+    media_type = "text/plain"
+    format = "txt"
+
+
+class CSVRenderer(ShoppingListRenderer):
+    media_type = "text/csv"
+    format = "csv"
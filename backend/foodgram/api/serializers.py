@@ -1,8 +1,7 @@
 import django.contrib.auth.password_validation as validators
 from django.contrib.auth import authenticate
-from django.shortcuts import get_object_or_404
+from django.db import transaction
 from djoser.serializers import UserCreateSerializer, UserSerializer
-from drf_base64.fields import Base64ImageField
 from rest_framework import serializers
 from rest_framework.relations import SlugRelatedField
 
@@ -16,10 +15,25 @@ from recipe.models import (
     Tag,
     User,
 )
+from recipe.images import get_variant_urls
+from .fields import RecipeImageField
 
 ERR_MSG = "Не удается войти в систему с предоставленными учетными данными."
 
 
+def get_image_variants(recipe, context):
+    """Ссылки на уменьшенные копии, абсолютные, если есть запрос."""
+    urls = get_variant_urls(recipe)
+    request = context.get("request")
+    if request is None:
+        return urls
+    return {
+        variant: {extension: request.build_absolute_uri(url)
+                  for extension, url in formats.items()}
+        for variant, formats in urls.items()
+    }
+
+
 class TokenSerializer(serializers.Serializer):  # noqa
     email = serializers.CharField(label="Email", write_only=True)
     password = serializers.CharField(
@@ -61,11 +75,8 @@ class CustomUserSerializer(UserSerializer):
 
     def get_is_subscribed(self, obj):
         user = self.context["request"].user
-        follow = self.context["follow"]
-        if str(user) != "AnonymousUser":
-            if follow.filter(user=user, author=obj):
-                return True
-            return False
+        if user.is_authenticated:
+            return obj.id in self.context["follow"]
         return None
 
 
@@ -89,9 +100,11 @@ class UserCustomCreateSerializer(UserCreateSerializer):
 
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source="recipe_id")
     name = serializers.SerializerMethodField()
     cooking_time = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = ShoppingCart
@@ -99,6 +112,7 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
 
@@ -110,15 +124,20 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
     def get_image(obj):
         return obj.recipe.image.url
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj.recipe, self.context)
+
     @staticmethod
     def get_cooking_time(obj):
         return obj.recipe.cooking_time
 
 
 class FavoriteSerializer(serializers.ModelSerializer):
+    id = serializers.ReadOnlyField(source="recipe_id")
     name = serializers.SerializerMethodField()
     cooking_time = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Favorite
@@ -126,6 +145,7 @@ class FavoriteSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
 
@@ -137,11 +157,47 @@ class FavoriteSerializer(serializers.ModelSerializer):
     def get_image(obj):
         return obj.recipe.image.url
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj.recipe, self.context)
+
     @staticmethod
     def get_cooking_time(obj):
         return obj.recipe.cooking_time
 
 
+def ids_field():
+    """Непустой список id без повторов (порядок сохраняется)."""
+    return serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=100,
+    )
+
+
+def unique_ids(value):
+    return list(dict.fromkeys(value))
+
+
+class RecipeIdsSerializer(serializers.Serializer):  # noqa
+    """Список id рецептов для массового добавления и удаления."""
+
+    recipes = ids_field()
+
+    @staticmethod
+    def validate_recipes(value):
+        return unique_ids(value)
+
+
+class AuthorIdsSerializer(serializers.Serializer):  # noqa
+    """Список id авторов для массовой подписки и отписки."""
+
+    authors = ids_field()
+
+    @staticmethod
+    def validate_authors(value):
+        return unique_ids(value)
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -180,7 +236,8 @@ class IngredientsqRecipeSerializer(serializers.ModelSerializer):
 class RecipeSerializer(serializers.ModelSerializer):
     is_in_shopping_cart = serializers.SerializerMethodField()
     is_favorited = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    image = RecipeImageField()
+    image_variants = serializers.SerializerMethodField()
     author = CustomUserSerializer()
     tags = TagSerializer(many=True)
     ingredients = IngredientsqRecipeSerializer(
@@ -198,32 +255,32 @@ class RecipeSerializer(serializers.ModelSerializer):
             "is_in_shopping_cart",
             "name",
             "image",
+            "image_variants",
             "text",
             "cooking_time",
+            "favorites_count",
+            "in_carts_count",
         )
-        read_only_fields = ("author",)
+        read_only_fields = ("author", "favorites_count", "in_carts_count")
 
     def get_is_in_shopping_cart(self, obj):
         user = self.context["request"].user
-        shopping_cart = self.context["shopping_cart"]
-        if str(user) != "AnonymousUser":
-            if shopping_cart.filter(recipe=obj, user=user):
-                return True
-            return False
+        if user.is_authenticated:
+            return obj.is_in_shopping_cart
         return None
 
     def get_is_favorited(self, obj):
         user = self.context["request"].user
-        favorite = self.context["favorite"]
-        if str(user) != "AnonymousUser":
-            if favorite.filter(recipe=obj, user=user):
-                return True
-            return False
+        if user.is_authenticated:
+            return obj.is_favorited
         return None
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context)
+
 
 class IngredientRecipesSerializer(serializers.ModelSerializer):
-    id = serializers.CharField(source="ingredient")
+    id = serializers.IntegerField(source="ingredient")
 
     class Meta:
         model = IngredientRecipe
@@ -239,11 +296,9 @@ class RecipeCreatySerializer(serializers.ModelSerializer):
         read_only=True,
         default=serializers.CurrentUserDefault(),
     )
-    tags = serializers.SlugRelatedField(
-        queryset=Tag.objects.all(), slug_field="pk", many=True
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
     ingredients = IngredientRecipesSerializer(many=True)
-    image = Base64ImageField(max_length=None, use_url=True)
+    image = RecipeImageField(max_length=None, use_url=True)
 
     class Meta:
         model = Recipe
@@ -259,26 +314,45 @@ class RecipeCreatySerializer(serializers.ModelSerializer):
         )
         read_only_fields = ("author",)
 
+    @staticmethod
+    def check_ids(ids, model, name):
+        """Несуществующие и повторяющиеся id одним запросом к базе."""
+        unique_ids, duplicates = set(), set()
+        for pk in ids:
+            if pk in unique_ids:
+                duplicates.add(pk)
+            unique_ids.add(pk)
+        found = set(
+            model.objects.filter(pk__in=unique_ids).values_list("pk",
+                                                                flat=True)
+        )
+        messages = []
+        if unique_ids - found:
+            messages.append(
+                f"{name}: не существуют id {sorted(unique_ids - found)}!"
+            )
+        if duplicates:
+            messages.append(f"{name}: повторяются id {sorted(duplicates)}!")
+        return messages
+
     def validate(self, data):
-        ingredients = data["ingredients"]
-        ingredient_list = []
-        for items in ingredients:
-            ingredient = get_object_or_404(Ingredient, id=items["ingredient"])
-            if ingredient in ingredient_list:
-                raise serializers.ValidationError(
-                    "Ингредиент должен быть уникальным!"
-                )
-            ingredient_list.append(ingredient)
-        tags = data["tags"]
-        if not tags:
-            raise serializers.ValidationError(
-                "Нужен хотя бы один тэг для рецепта!"
+        errors = {}
+        if "ingredients" in data:
+            errors["ingredients"] = self.check_ids(
+                [item["ingredient"] for item in data["ingredients"]],
+                Ingredient,
+                "Ингредиенты",
             )
-        for tag_name in tags:
-            if not Tag.objects.filter(slug=tag_name).exists():
-                raise serializers.ValidationError(
-                    f"Тэга {tag_name} не существует!"
-                )
+        if "tags" in data:
+            errors["tags"] = (
+                self.check_ids(data["tags"], Tag, "Тэги")
+                if data["tags"]
+                else ["Нужен хотя бы один тэг для рецепта!"]
+            )
+        errors = {field: messages for field, messages in errors.items()
+                  if messages}
+        if errors:
+            raise serializers.ValidationError(errors)
         return data
 
     @staticmethod
@@ -300,13 +374,47 @@ class RecipeCreatySerializer(serializers.ModelSerializer):
 
     @staticmethod
     def create_ingredients(ingredients, recipe):
-        for ingredient in ingredients:
-            IngredientRecipe.objects.create(
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(
                 recipe=recipe,
                 ingredient_id=ingredient["ingredient"],
                 amount=ingredient["amount"],
             )
+            for ingredient in ingredients
+        )
+
+    @staticmethod
+    def update_ingredients(ingredients, recipe):
+        """
+        Меняет только то, что изменилось: удаляет лишние строки,
+        обновляет количества и добавляет новые ингредиенты.
+        """
+        amounts = {
+            int(ingredient["ingredient"]): ingredient["amount"]
+            for ingredient in ingredients
+        }
+        existing = {item.ingredient_id: item for item in recipe.recipe.all()}
+        removed = existing.keys() - amounts.keys()
+        if removed:
+            IngredientRecipe.objects.filter(
+                recipe=recipe, ingredient_id__in=removed
+            ).delete()
+        changed = []
+        for ingredient_id, item in existing.items():
+            amount = amounts.get(ingredient_id)
+            if amount is not None and item.amount != amount:
+                item.amount = amount
+                changed.append(item)
+        if changed:
+            IngredientRecipe.objects.bulk_update(changed, ["amount"])
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe=recipe, ingredient_id=ingredient_id,
+                             amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        )
 
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop("ingredients")
         tags = validated_data.pop("tags")
@@ -315,28 +423,27 @@ class RecipeCreatySerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         if "ingredients" in validated_data:
             ingredients = validated_data.pop("ingredients")
-            instance.ingredients.clear()
-            self.create_ingredients(ingredients, instance)
+            self.update_ingredients(ingredients, instance)
         if "tags" in validated_data:
             instance.tags.set(validated_data.pop("tags"))
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
-        return RecipeSerializer(
-            instance,
-            context={
-                "request": self.context.get("request"),
-                "follow": Follow.objects.all(),
-                "favorite": Favorite.objects.all(),
-                "shopping_cart": ShoppingCart.objects.all(),
-            },
-        ).data
+        user = self.context["request"].user
+        instance = (
+            Recipe.objects.with_related()
+            .with_user_flags(user)
+            .get(pk=instance.pk)
+        )
+        return RecipeSerializer(instance, context=self.context).data
 
 
 class RecipeFollowSerializer(serializers.ModelSerializer):
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
@@ -344,9 +451,13 @@ class RecipeFollowSerializer(serializers.ModelSerializer):
             "id",
             "name",
             "image",
+            "image_variants",
             "cooking_time",
         )
 
+    def get_image_variants(self, obj):
+        return get_image_variants(obj, self.context)
+
 
 class FollowSerializer(serializers.ModelSerializer):
     is_subscribed = serializers.SerializerMethodField()
@@ -371,28 +482,20 @@ class FollowSerializer(serializers.ModelSerializer):
             "recipes_count",
         )
 
-    def get_recipes(self, obj):
-        request = self.context.get("request")
-        limit = request.GET.get("recipes_limit")
-        recipes = (
-            obj.author.recipe_user.all()[: int(limit)]
-            if limit
-            else obj.author.recipe_user.all()
-        )
-        return RecipeFollowSerializer(recipes, many=True).data
+    @staticmethod
+    def get_recipes(obj):
+        return RecipeFollowSerializer(obj.author.recipes_preview,
+                                      many=True).data
 
     def get_is_subscribed(self, obj):
         user = self.context["request"].user
-        follow = self.context["follow"]
-        if str(user) != "AnonymousUser":
-            if follow.filter(user=user, author=obj.author):
-                return True
-            return False
+        if user.is_authenticated:
+            return obj.author_id in self.context["follow"]
         return None
 
     @staticmethod
     def get_recipes_count(obj):
-        return obj.author.recipe_user.all().count()
+        return obj.recipes_count
 
 
 class UserPasswordSerializer(serializers.Serializer):  # noqa
@@ -0,0 +1,840 @@
+import base64
+import datetime
+import json
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from recipe import feed, images
+from recipe.models import (Favorite, FeedItem, Follow, Ingredient,
+                           IngredientRecipe, Recipe, ShoppingCart, Tag, User)
+from recipe.versions import INGREDIENTS, bump_version
+from . import download_shopping_cart
+
+RECIPE_COUNTS = (6, 50, 200)
+IMAGE = (
+    "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAA"
+    "DUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg=="
+)
+
+
+class QueryCountTests(TestCase):
+    """
+    Число запросов к БД у списков не зависит от числа рецептов: связи
+    подгружаются на страницу целиком, а не на каждую строку.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="reader@example.com", username="reader", password="x")
+        cls.authors = [
+            User.objects.create_user(email=f"author{index}@example.com",
+                                     username=f"author{index}", password="x")
+            for index in range(4)
+        ]
+        Follow.objects.bulk_create(
+            Follow(user=cls.user, author=author) for author in cls.authors)
+        cls.tags = [
+            Tag.objects.create(name=f"Тэг {index}", color=f"#00000{index}",
+                               slug=f"tag{index}")
+            for index in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"Ингредиент {index}",
+                                      measurement_unit="г")
+            for index in range(5)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def create_recipes(self, count):
+        Recipe.objects.bulk_create(
+            Recipe(name=f"Рецепт {index}", text="Описание", cooking_time=10,
+                   author=self.authors[index % len(self.authors)],
+                   image="recipe/test.png")
+            for index in range(count)
+        )
+        recipes = list(Recipe.objects.values_list("pk", flat=True))
+        Recipe.tags.through.objects.bulk_create(
+            Recipe.tags.through(recipe_id=recipe, tag=tag)
+            for recipe in recipes for tag in self.tags
+        )
+        IngredientRecipe.objects.bulk_create(
+            IngredientRecipe(recipe_id=recipe, ingredient=ingredient,
+                             amount=1)
+            for recipe in recipes for ingredient in self.ingredients
+        )
+
+    def assert_queries(self, url, queries, rendered):
+        """
+        Страница растёт вместе с числом рецептов (?limit=), а запросов
+        столько же. rendered — сколько рецептов попало в ответ.
+        """
+        for count in RECIPE_COUNTS:
+            with self.subTest(recipes=count):
+                Recipe.objects.all().delete()
+                self.create_recipes(count)
+                with self.assertNumQueries(queries):
+                    response = self.client.get(url, {"limit": count})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(rendered(response.json()["results"]),
+                                 count)
+
+    def test_recipes_list(self):
+        self.assert_queries(reverse("api:recipes-list"), 6, len)
+
+    def test_subscriptions(self):
+        self.assert_queries(
+            reverse("api:follow-list"), 4,
+            lambda follows: sum(len(follow["recipes"])
+                                for follow in follows))
+
+
+class DownloadShoppingCartTests(TestCase):
+    """Ошибки выгрузки списка покупок — JSON при любом ?format."""
+
+    def test_error_is_json(self):
+        url = reverse("api:recipes-download-shopping-cart")
+        for file_format in ("", "pdf", "txt", "csv", "json"):
+            with self.subTest(format=file_format):
+                response = APIClient().get(
+                    url, {"format": file_format} if file_format else {})
+                self.assertEqual(response.status_code, 401)
+                self.assertEqual(response["Content-Type"],
+                                 "application/json")
+                self.assertIn("detail", response.json())
+
+    def test_pdf_by_default(self):
+        user = User.objects.create_user(
+            email="buyer@example.com", username="buyer", password="x")
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get(reverse("api:recipes-download-shopping-cart"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+
+
+class ShoppingCartPDFCacheTests(TestCase):
+    """PDF рисуется заново, только когда изменилось содержимое списка."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="buyer@example.com", username="buyer", password="x")
+        cls.ingredient = Ingredient.objects.create(name="Соль",
+                                                   measurement_unit="г")
+        cls.recipe = Recipe.objects.create(
+            name="Рецепт", text="Описание", cooking_time=10, author=cls.user,
+            image="recipe/test.png")
+        IngredientRecipe.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.ingredient, amount=5)
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipe)
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def download(self):
+        response = self.client.get(
+            reverse("api:recipes-download-shopping-cart"))
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def test_rendered_once_per_content(self):
+        with mock.patch.object(download_shopping_cart, "render_pdf",
+                               wraps=download_shopping_cart.render_pdf
+                               ) as render_pdf:
+            first = self.download()
+            self.assertEqual(self.download(), first)
+            self.assertEqual(render_pdf.call_count, 1)
+            IngredientRecipe.objects.filter(recipe=self.recipe).update(
+                amount=7)
+            self.assertNotEqual(self.download(), first)
+            self.assertEqual(render_pdf.call_count, 2)
+        self.assertTrue(first.startswith(b"%PDF"))
+
+
+@override_settings(INGREDIENT_SEARCH_IN_MEMORY=False,
+                   INGREDIENT_SEARCH_LIMIT=3)
+class IngredientSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f"Salt {index}", measurement_unit="г")
+            for index in range(5)
+        )
+        cls.ingredient = Ingredient.objects.order_by("pk").first()
+
+    def test_search_is_limited(self):
+        response = self.client.get(reverse("api:ingredient-list"),
+                                   {"name": "sal"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 3)
+
+    def test_list_without_search(self):
+        response = self.client.get(reverse("api:ingredient-list"))
+        self.assertEqual(len(response.json()), 5)
+
+    def test_retrieve_with_search(self):
+        response = self.client.get(
+            reverse("api:ingredient-detail", args=[self.ingredient.pk]),
+            {"name": "sal"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["id"], self.ingredient.pk)
+
+
+@override_settings(INGREDIENT_SEARCH_IN_MEMORY=True,
+                   INGREDIENT_SEARCH_CONTAINS=True,
+                   INGREDIENT_SEARCH_LIMIT=3)
+class IngredientIndexTests(TestCase):
+    """Автодополнение из индекса в памяти."""
+
+    @classmethod
+    def setUpTestData(cls):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit="г")
+            for name in ("Сахарная пудра", "Сахар", "Ванильный сахар",
+                         "Соль", "Сахарин")
+        )
+
+    def setUp(self):
+        bump_version(INGREDIENTS)
+
+    def search(self, name):
+        response = self.client.get(reverse("api:ingredient-list"),
+                                   {"name": name})
+        self.assertEqual(response.status_code, 200)
+        return [item["name"] for item in response.json()]
+
+    def test_prefix_before_contains(self):
+        self.assertEqual(self.search("сах"),
+                         ["Сахар", "Сахарин", "Сахарная пудра"])
+        self.assertEqual(self.search("ахар"),
+                         ["Ванильный сахар", "Сахар", "Сахарин"])
+
+    def test_no_queries_when_built(self):
+        self.search("со")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.search("СО"), ["Соль"])
+
+    def test_rebuilt_after_change(self):
+        self.assertEqual(self.search("мёд"), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            Ingredient.objects.create(name="Мёд", measurement_unit="г")
+        self.assertEqual(self.search("мёд"), ["Мёд"])
+
+
+class ReferenceETagTests(TestCase):
+    """Условный GET тэгов и ингредиентов."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.tag = Tag.objects.create(name="Завтрак", color="#E26C2D",
+                                     slug="breakfast")
+        Ingredient.objects.create(name="Соль", measurement_unit="г")
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, etag=None, **params):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        return self.client.get(url, params, **headers)
+
+    def test_not_modified_on_match(self):
+        url = reverse("api:tags-list")
+        etag = self.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.get(url, etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_modified_after_version_bump(self):
+        url = reverse("api:tags-list")
+        etag = self.get(url)["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="Обед", color="#00FF00", slug="lunch")
+        response = self.get(url, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.json()), 2)
+
+    def test_list_etag_does_not_match_other_responses(self):
+        etag = self.get(reverse("api:tags-list"))["ETag"]
+        self.assertEqual(
+            self.get(reverse("api:tags-detail", args=[0]), etag).status_code,
+            404)
+        self.assertEqual(
+            self.get(reverse("api:tags-detail", args=[self.tag.pk]),
+                     etag).status_code,
+            200)
+        etag = self.get(reverse("api:ingredient-list"))["ETag"]
+        response = self.get(reverse("api:ingredient-list"), etag, name="со")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            self.get(reverse("api:ingredient-list"), response["ETag"],
+                     name="со").status_code,
+            304)
+
+
+class KeysetPaginationTests(TestCase):
+    """Обход всех страниц курсором отдаёт каждую запись ровно один раз."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="reader@example.com", username="reader", password="x")
+        Recipe.objects.bulk_create(
+            Recipe(name=f"Рецепт {index}", text="Описание", cooking_time=10,
+                   author=cls.user, image="recipe/test.png")
+            for index in range(40)
+        )
+        # По четыре рецепта на миллисекунду: курсор с миллисекундами
+        # пропускал бы соседей последней записи страницы.
+        start = timezone.now().replace(microsecond=0)
+        for index, pk in enumerate(
+                Recipe.objects.order_by("pk").values_list("pk", flat=True)):
+            Recipe.objects.filter(pk=pk).update(
+                created=start + datetime.timedelta(microseconds=250 * index))
+
+    def walk(self, url):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ids = []
+        while url:
+            response = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids += [recipe["id"] for recipe in response.json()["results"]]
+            url = response.json()["next"]
+        return ids
+
+    def test_feed_once(self):
+        reader = User.objects.create_user(
+            email="follower@example.com", username="follower", password="x")
+        Follow.objects.create(user=reader, author=self.user)
+        feed.backfill([(reader.pk, self.user.pk)])
+        self.user = reader
+        ids = self.walk(reverse("api:recipes-feed") + "?limit=6")
+        self.assertEqual(len(ids),
+                         FeedItem.objects.filter(user=reader).count())
+        self.assertEqual(len(set(ids)), len(ids))
+
+    def test_all_recipes_once(self):
+        for ordering in ("-created", "-popularity", "cooking_time"):
+            with self.subTest(ordering=ordering):
+                ids = self.walk(
+                    reverse("api:recipes-list")
+                    + f"?ordering={ordering}&pagination=cursor&limit=6")
+                self.assertEqual(len(ids), Recipe.objects.count())
+                self.assertEqual(len(set(ids)), len(ids))
+
+
+class ServerTimingTests(TestCase):
+    """Server-Timing — только в DEBUG и сотрудникам."""
+
+    def get(self, **user_fields):
+        user = User.objects.create_user(
+            email="timing@example.com", username="timing", password="x",
+            **user_fields)
+        client = APIClient()
+        client.force_authenticate(user)
+        return client.get(reverse("api:recipes-list"))
+
+    def test_hidden_from_users(self):
+        self.assertNotIn("Server-Timing", self.get())
+
+    def test_shown_to_staff(self):
+        timing = self.get(is_staff=True)["Server-Timing"]
+        self.assertIn("db;dur=", timing)
+        self.assertIn("render;dur=", timing)
+
+
+class RequestLogTests(TestCase):
+    """Строка JSON на запрос — на уровне DEBUG, поток не измеряется."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user(
+            email="staff@example.com", username="staff", password="x",
+            is_staff=True))
+
+    def get_record(self, url, params=None):
+        with self.assertLogs("api.middleware", "DEBUG") as logs:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(logs.records[0].levelname, "DEBUG")
+        return response, json.loads(logs.records[0].getMessage())
+
+    def test_measured(self):
+        response, record = self.get_record(reverse("api:recipes-list"))
+        self.assertIn("Server-Timing", response)
+        self.assertGreater(record["queries"], 0)
+        self.assertEqual(record["size"], len(response.content))
+        self.assertNotIn("measured", record)
+
+    def test_streaming_is_unmeasured(self):
+        response, record = self.get_record(
+            reverse("api:recipes-download-shopping-cart"),
+            {"format": "txt"})
+        self.assertTrue(response.streaming)
+        self.assertNotIn("Server-Timing", response)
+        self.assertIs(record["measured"], False)
+        self.assertNotIn("queries", record)
+        self.assertNotIn("size", record)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(
+            email="staff@example.com", username="staff", password="x",
+            is_staff=True)
+
+    def test_closed_by_default(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(
+            User.objects.create_user(email="user@example.com",
+                                     username="user", password="x"))
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(
+            self.client.get("/metrics",
+                            HTTP_AUTHORIZATION="Bearer wrong").status_code,
+            403)
+        self.assertEqual(
+            self.client.get("/metrics",
+                            HTTP_AUTHORIZATION="Bearer secret").status_code,
+            200)
+
+    def test_object_counts_are_cached(self):
+        self.client.force_login(self.staff)
+        with override_settings(METRICS_OBJECTS_TTL=0):
+            self.client.get("/metrics")
+        User.objects.create_user(email="new@example.com", username="new",
+                                 password="x")
+        with override_settings(METRICS_OBJECTS_TTL=300):
+            text = self.client.get("/metrics").content.decode()
+        self.assertIn('foodgram_objects{object="users"} 1.0', text)
+        self.assertRegex(
+            text, r'foodgram_db_connections_open\{alias="default"\} [1-9]')
+
+
+class RecipeWriteTestCase(TestCase):
+    """
+    Запись рецептов через API: картинки сохраняются во временный
+    MEDIA_ROOT, автор с тэгами и ингредиентами уже есть.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="cook@example.com", username="cook", password="x")
+        cls.tags = [
+            Tag.objects.create(name=f"Тэг {index}", color=f"#00000{index}",
+                               slug=f"tag{index}")
+            for index in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f"Ингредиент {index}",
+                                      measurement_unit="г")
+            for index in range(4)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def recipe_data(self, **fields):
+        return {
+            "name": "Рецепт", "text": "Описание", "cooking_time": 10,
+            "image": IMAGE, "tags": [self.tags[0].pk],
+            "ingredients": [{"id": self.ingredients[0].pk, "amount": 1}],
+            **fields,
+        }
+
+
+class RecipeIngredientsUpdateTests(RecipeWriteTestCase):
+    def test_patch_diffs_ingredients(self):
+        first, second, third, fourth = self.ingredients
+        response = self.client.post(
+            reverse("api:recipes-list"),
+            self.recipe_data(ingredients=[
+                {"id": first.pk, "amount": 1},
+                {"id": second.pk, "amount": 2},
+                {"id": third.pk, "amount": 3},
+            ]),
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        recipe_id = response.json()["id"]
+        kept = IngredientRecipe.objects.get(recipe_id=recipe_id,
+                                            ingredient=first)
+        updated = IngredientRecipe.objects.get(recipe_id=recipe_id,
+                                               ingredient=second)
+
+        response = self.client.patch(
+            reverse("api:recipes-detail", args=[recipe_id]),
+            {"ingredients": [{"id": first.pk, "amount": 1},
+                             {"id": second.pk, "amount": 5},
+                             {"id": fourth.pk, "amount": 4}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            set(IngredientRecipe.objects.filter(recipe_id=recipe_id)
+                .values_list("ingredient_id", "amount")),
+            {(first.pk, 1), (second.pk, 5), (fourth.pk, 4)})
+        # Оставшиеся строки обновлены на месте, а не пересозданы.
+        self.assertTrue(IngredientRecipe.objects.filter(
+            pk=kept.pk, amount=1).exists())
+        self.assertTrue(IngredientRecipe.objects.filter(
+            pk=updated.pk, amount=5).exists())
+        self.assertEqual(IngredientRecipe.objects.count(), 3)
+        self.assertEqual(
+            sorted(item["amount"] for item in response.json()["ingredients"]),
+            [1, 4, 5])
+
+
+class RecipeValidationTests(RecipeWriteTestCase):
+    def post(self, **fields):
+        return self.client.post(reverse("api:recipes-list"),
+                                self.recipe_data(**fields), format="json")
+
+    def test_duplicate_and_unknown_ingredients(self):
+        pk = self.ingredients[0].pk
+        response = self.post(ingredients=[
+            {"id": pk, "amount": 1}, {"id": pk, "amount": 2},
+            {"id": 0, "amount": 1},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"ingredients": [
+            "Ингредиенты: не существуют id [0]!",
+            f"Ингредиенты: повторяются id [{pk}]!",
+        ]})
+
+    def test_duplicate_and_unknown_tags(self):
+        pk = self.tags[0].pk
+        response = self.post(tags=[pk, pk, 0])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"tags": [
+            "Тэги: не существуют id [0]!",
+            f"Тэги: повторяются id [{pk}]!",
+        ]})
+
+    def test_empty_tags(self):
+        response = self.post(tags=[])
+        self.assertEqual(response.json(),
+                         {"tags": ["Нужен хотя бы один тэг для рецепта!"]})
+
+    def test_ids_checked_in_one_query_each(self):
+        # По одному запросу на ингредиенты и на тэги.
+        with self.assertNumQueries(2):
+            response = self.post(
+                tags=[0], ingredients=[{"id": 0, "amount": 1}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Recipe.objects.count(), 0)
+
+
+class AnonymousRecipeCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="cook@example.com", username="cook", password="x")
+        cls.recipe = Recipe.objects.create(
+            name="Рецепт", text="Описание", cooking_time=10,
+            author=cls.author, image="recipe/test.png")
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_miss_then_hit(self):
+        url = reverse("api:recipes-list")
+        self.assertEqual(self.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.get(url)["X-Cache"], "HIT")
+        self.assertEqual(self.get(url, limit=2, page=1)["X-Cache"], "MISS")
+        self.assertEqual(self.get(url, page=1, limit=2)["X-Cache"], "HIT")
+
+    def test_every_param_is_in_key(self):
+        url = reverse("api:recipes-list")
+        self.get(url)
+        for params in ({"is_favorited": 1}, {"is_in_shopping_cart": 1},
+                       {"is_favorited": 0}):
+            with self.subTest(**params):
+                self.assertEqual(self.get(url, **params)["X-Cache"], "MISS")
+
+    def test_patch_invalidates(self):
+        detail = reverse("api:recipes-detail", args=[self.recipe.pk])
+        listing = reverse("api:recipes-list")
+        for url in (detail, listing):
+            self.get(url)
+            self.assertEqual(self.get(url)["X-Cache"], "HIT")
+        client = APIClient()
+        client.force_authenticate(self.author)
+        with mock.patch.object(images, "get_executor"), \
+                self.captureOnCommitCallbacks(execute=True):
+            response = client.patch(detail, {"name": "Новое название"},
+                                    format="json")
+        self.assertEqual(response.status_code, 200)
+        for url in (detail, listing):
+            with self.subTest(url=url):
+                response = self.get(url)
+                self.assertEqual(response["X-Cache"], "MISS")
+                self.assertIn("Новое название", response.content.decode())
+
+
+class RecipeToggleTests(TestCase):
+    """Одиночные favorite и shopping_cart: повторы не дублируют строки."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="reader@example.com", username="reader", password="x")
+        cls.recipe = Recipe.objects.create(
+            name="Рецепт", text="Описание", cooking_time=10,
+            author=cls.user, image="recipe/test.png")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_repeated_requests(self):
+        for name, model in (("favorite", Favorite),
+                            ("shopping-cart", ShoppingCart)):
+            url = reverse(f"api:recipes-{name}", args=[self.recipe.pk])
+            with self.subTest(name):
+                self.assertEqual(self.client.post(url).status_code, 201)
+                self.assertEqual(self.client.post(url).status_code, 400)
+                self.assertEqual(
+                    model.objects.filter(user=self.user).count(), 1)
+                self.assertEqual(self.client.delete(url).status_code, 204)
+                self.assertEqual(self.client.delete(url).status_code, 400)
+                self.assertFalse(model.objects.filter(user=self.user).exists())
+        self.recipe.refresh_from_db()
+        self.assertEqual(
+            (self.recipe.favorites_count, self.recipe.in_carts_count), (0, 0))
+
+    def test_unknown_recipe(self):
+        url = reverse("api:recipes-favorite", args=[self.recipe.pk + 1])
+        self.assertEqual(self.client.post(url).status_code, 404)
+        self.assertEqual(self.client.delete(url).status_code, 400)
+
+
+class RecipeBulkToggleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            email="reader@example.com", username="reader", password="x")
+        cls.recipes = [
+            Recipe.objects.create(name=f"Рецепт {index}", text="Описание",
+                                  cooking_time=10, author=cls.user,
+                                  image="recipe/test.png")
+            for index in range(3)
+        ]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def request(self, method, url, ids):
+        response = getattr(self.client, method)(
+            url, {"recipes": ids}, format="json")
+        self.assertEqual(response.status_code, 200)
+        return [(row["id"], row["status"])
+                for row in response.data["results"]]
+
+    def test_statuses_and_repeats(self):
+        first, second, third = (recipe.pk for recipe in self.recipes)
+        missing = third + 1
+        for name, model in (("favorite-bulk", Favorite),
+                            ("shopping-cart-bulk", ShoppingCart)):
+            url = reverse(f"api:recipes-{name}")
+            with self.subTest(name):
+                self.assertEqual(
+                    self.request("post", url, [first, missing, first]),
+                    [(first, "added"), (missing, "not_found")])
+                self.assertEqual(
+                    self.request("post", url, [first, second]),
+                    [(first, "exists"), (second, "added")])
+                self.assertEqual(
+                    model.objects.filter(user=self.user).count(), 2)
+                self.assertEqual(
+                    self.request("delete", url, [first, third]),
+                    [(first, "removed"), (third, "missing")])
+                self.assertEqual(
+                    self.request("delete", url, [first, second]),
+                    [(first, "missing"), (second, "removed")])
+                self.assertFalse(
+                    model.objects.filter(user=self.user).exists())
+        self.assertEqual(
+            set(Recipe.objects.values_list("favorites_count",
+                                           "in_carts_count")),
+            {(0, 0)})
+
+    def test_invalid_body(self):
+        url = reverse("api:recipes-favorite-bulk")
+        for body in ({}, {"recipes": []}, {"recipes": [0]},
+                     {"recipes": "1"}):
+            with self.subTest(body=body):
+                response = self.client.post(url, body, format="json")
+                self.assertEqual(response.status_code, 400)
+
+
+class SubscribeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author = (
+            User.objects.create_user(email=f"{name}@example.com",
+                                     username=name, password="x")
+            for name in ("reader", "author")
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def url(self, pk):
+        return reverse("api:user-subscribe", args=[pk])
+
+    def test_subscribe_twice(self):
+        url = self.url(self.author.pk)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data["id"], self.author.pk)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], "Уже подписан!")
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 1)
+
+    def test_unsubscribe_twice(self):
+        Follow.objects.create(user=self.reader, author=self.author)
+        url = self.url(self.author.pk)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        response = self.client.delete(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data["errors"], "Подписка отсутствует!")
+        self.assertFalse(Follow.objects.filter(user=self.reader).exists())
+
+    def test_self_and_unknown_author(self):
+        response = self.client.post(self.url(self.reader.pk))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.post(self.url(0)).status_code, 404)
+        self.assertEqual(self.client.delete(self.url(0)).status_code, 400)
+        self.assertFalse(Follow.objects.exists())
+
+
+class RecipeImageVariantsTests(RecipeWriteTestCase):
+    def create(self):
+        with mock.patch.object(images, "get_executor") as get_executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse("api:recipes-list"),
+                                        self.recipe_data(), format="json")
+        self.assertEqual(response.status_code, 201)
+        return Recipe.objects.get(pk=response.data["id"]), get_executor
+
+    def patch(self, recipe, **fields):
+        with mock.patch.object(images, "get_executor") as get_executor, \
+                self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                reverse("api:recipes-detail", args=[recipe.pk]), fields,
+                format="json")
+        self.assertEqual(response.status_code, 200)
+        return get_executor
+
+    def test_variants_are_generated(self):
+        recipe, get_executor = self.create()
+        get_executor.return_value.submit.assert_called_once_with(
+            images.process, recipe.pk, recipe.image.name)
+        # process закрывает соединения потока, тестовое не трогаем.
+        with mock.patch.object(images, "connections"):
+            images.process(recipe.pk, recipe.image.name)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants["source"], recipe.image.name)
+        storage = recipe.image.storage
+        for variant in images.VARIANTS:
+            for extension in images.FORMATS:
+                self.assertTrue(storage.exists(
+                    recipe.image_variants[variant][extension]))
+        response = self.client.get(
+            reverse("api:recipes-detail", args=[recipe.pk]))
+        self.assertEqual(set(response.data["image_variants"]),
+                         set(images.VARIANTS))
+
+    def test_unchanged_image_is_left_alone(self):
+        recipe, _ = self.create()
+        with mock.patch.object(images, "connections"):
+            images.process(recipe.pk, recipe.image.name)
+        recipe.refresh_from_db()
+        variants = recipe.image_variants
+        get_executor = self.patch(recipe, name="Новое название")
+        get_executor.assert_not_called()
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.image_variants, variants)
+
+        get_executor = self.patch(recipe, image=IMAGE)
+        recipe.refresh_from_db()
+        self.assertNotEqual(recipe.image.name, variants["source"])
+        get_executor.return_value.submit.assert_called_once_with(
+            images.process, recipe.pk, recipe.image.name)
+
+
+class RecipeMultipartUploadTests(RecipeWriteTestCase):
+    def post(self):
+        first, second = self.ingredients[:2]
+        image = SimpleUploadedFile(
+            "photo.png", base64.b64decode(IMAGE.split(",", 1)[1]),
+            content_type="image/png")
+        return self.client.post(reverse("api:recipes-list"), {
+            "name": "Рецепт", "text": "Описание", "cooking_time": 10,
+            "tags": [tag.pk for tag in self.tags],
+            "ingredients[0]id": first.pk, "ingredients[0]amount": 1,
+            "ingredients[1]id": second.pk, "ingredients[1]amount": 2,
+            "image": image,
+        }, format="multipart")
+
+    def test_create(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 201)
+        recipe = Recipe.objects.get(pk=response.data["id"])
+        self.assertTrue(recipe.image.storage.exists(recipe.image.name))
+        self.assertEqual(recipe.tags.count(), 2)
+        self.assertEqual(
+            set(IngredientRecipe.objects.filter(recipe=recipe)
+                .values_list("amount", flat=True)),
+            {1, 2})
+
+    @override_settings(IMAGE_MAX_UPLOAD_SIZE=16)
+    def test_too_large(self):
+        response = self.post()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("16 байт", response.data["detail"])
+        self.assertFalse(Recipe.objects.exists())
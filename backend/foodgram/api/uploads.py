@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler
+from django.http.multipartparser import MultiPartParserError
+
+
+class UploadTooLarge(MultiPartParserError):
+    pass
+
+
+class MaxSizeUploadHandler(FileUploadHandler):
+    """
+    Первый в цепочке обработчиков загрузки: считает байты каждого файла
+    по мере чтения multipart-потока и обрывает разбор, как только файл
+    перерос IMAGE_MAX_UPLOAD_SIZE. Сам файл дальше по кускам пишут
+    штатные обработчики (большой — во временный файл на диске).
+    DRF превращает ошибку разбора в ответ 400.
+    """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.IMAGE_MAX_UPLOAD_SIZE:
+            raise UploadTooLarge(
+                f"файл {self.file_name} больше "
+                f"{settings.IMAGE_MAX_UPLOAD_SIZE} байт"
+            )
+        return raw_data
+
+    def file_complete(self, file_size):
+        return None
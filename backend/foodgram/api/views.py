@@ -1,4 +1,7 @@
+from django.conf import settings
+from django.http import Http404
 from django.shortcuts import get_object_or_404
+from django.utils.functional import SimpleLazyObject
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
@@ -11,19 +14,28 @@ from rest_framework.permissions import (
     IsAuthenticated,
     IsAuthenticatedOrReadOnly,
 )
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from recipe.models import (Favorite, Follow, Ingredient, Recipe, ShoppingCart,
-                           Tag, User)
+from recipe.models import (Favorite, FeedItem, Follow, Ingredient, Recipe,
+                           ShoppingCart, Tag, User)
+from recipe.versions import INGREDIENTS, TAGS
+from .autocomplete import ingredient_index
 from .download_shopping_cart import download_shopping_cart
-from .filters import IngredientFilter, RecipeFilter
+from .filters import IngredientFilter, RecipeFilter, RecipeOrderingFilter
+from .mixins import AnonymousRecipeCacheMixin, VersionETagMixin
+from .pagination import KeysetPagination, SearchLimitPagination
 from .permissions import ReadOnly
+from .renderers import (CSVRenderer, PDFRenderer, PlainTextRenderer,
+                        ShoppingListRenderer)
 from .serializers import (
+    AuthorIdsSerializer,
     CustomUserSerializer,
     FavoriteSerializer,
     FollowSerializer,
     IngredientSerializer,
     RecipeCreatySerializer,
+    RecipeIdsSerializer,
     RecipeSerializer,
     ShoppingCartSerializer,
     TagSerializer,
@@ -32,6 +44,41 @@ from .serializers import (
     UserPasswordSerializer,
 )
 
+FAVORITE_MESSAGES = {
+    "exists": "Рецепт уже добавлен в избранное",
+    "deleted": "Рецепт {} удален из избранного",
+    "missing": "Рецепт не добавлен в избранное",
+}
+SHOPPING_CART_MESSAGES = {
+    "exists": "Рецепт уже добавлен в список покупок",
+    "deleted": "Рецепт {} удален из списка покупок",
+    "missing": "Рецепт не добавлен в список покупок",
+}
+SUBSCRIBE_ERRORS = {
+    "self": "На самого себя не подписаться!",
+    "exists": "Уже подписан!",
+    "missing": "Подписка отсутствует!",
+}
+
+
+def get_followed_authors(user):
+    """
+    Id авторов, на которых подписан пользователь.
+    Считается одним запросом и только при первом обращении.
+    """
+    return SimpleLazyObject(
+        lambda: set(
+            Follow.objects.filter(user=user).values_list("author_id",
+                                                         flat=True)
+        )
+    )
+
+
+def get_recipes_limit(request):
+    """Параметр recipes_limit: сколько рецептов автора показать."""
+    limit = request.query_params.get("recipes_limit", "")
+    return int(limit) if limit.isdigit() else None
+
 
 class FollowViewSet(viewsets.ModelViewSet):
     """Получение подписок пользователя"""
@@ -44,17 +91,17 @@ class FollowViewSet(viewsets.ModelViewSet):
     )
 
     def get_queryset(self):
-        review = Follow.objects.filter(user=self.request.user)
-        return review
+        return Follow.objects.filter(user=self.request.user).with_recipes(
+            get_recipes_limit(self.request)
+        )
 
     def get_serializer_context(self):
         context = super(FollowViewSet, self).get_serializer_context()
-        followers = Follow.objects.all()
-        context.update({"follow": followers})
+        context.update({"follow": get_followed_authors(self.request.user)})
         return context
 
 
-class RecipesViewSet(viewsets.ModelViewSet):
+class RecipesViewSet(AnonymousRecipeCacheMixin, viewsets.ModelViewSet):
     """
     Создание, удаление, редактирование рецептов.
     Добавление, удаление подписок.
@@ -63,9 +110,20 @@ class RecipesViewSet(viewsets.ModelViewSet):
 
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
     filterset_class = RecipeFilter
     permission_classes = (IsAuthenticatedOrReadOnly,)
 
+    @property
+    def paginator(self):
+        """?pagination=cursor включает keyset-пагинацию вместо page/limit."""
+        if not hasattr(self, "_paginator"):
+            if self.request.query_params.get("pagination") == "cursor":
+                self._paginator = KeysetPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_class(self):
         if self.action in ["create", "partial_update"]:
             return RecipeCreatySerializer
@@ -73,25 +131,41 @@ class RecipesViewSet(viewsets.ModelViewSet):
             return FavoriteSerializer
         elif self.action == "shopping_cart":
             return ShoppingCartSerializer
+        elif self.action in ["favorite_bulk", "shopping_cart_bulk"]:
+            return RecipeIdsSerializer
         return RecipeSerializer
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    def get_queryset(self):
+        return Recipe.objects.with_related().with_user_flags(
+            self.request.user)
+
     def get_serializer_context(self):
         context = super(RecipesViewSet, self).get_serializer_context()
-        followers = Follow.objects.all()
-        favorite = Favorite.objects.all()
-        shopping_cart = ShoppingCart.objects.all()
-        context.update(
-            {
-                "follow": followers,
-                "favorite": favorite,
-                "shopping_cart": shopping_cart,
-            }
-        )
+        context.update({"follow": get_followed_authors(self.request.user)})
         return context
 
+    def toggle(self, request, pk, model, messages):
+        """
+        POST добавляет рецепт, DELETE убирает: один INSERT ... ON CONFLICT
+        DO NOTHING или один DELETE, повторный запрос ничего не дублирует.
+        """
+        if request.method == "POST":
+            recipe = get_object_or_404(Recipe, pk=pk)
+            if not model.objects.add(request.user, recipe):
+                return Response({"errors": messages["exists"]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            serializer = self.get_serializer(
+                model(user=request.user, recipe=recipe))
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        if model.objects.remove(request.user, pk):
+            return Response({"message": messages["deleted"].format(pk)},
+                            status=status.HTTP_204_NO_CONTENT)
+        return Response({"errors": messages["missing"]},
+                        status=status.HTTP_400_BAD_REQUEST)
+
     @action(
         detail=True,
         url_path="favorite",
@@ -100,32 +174,7 @@ class RecipesViewSet(viewsets.ModelViewSet):
     )
     def favorite(self, request, pk=None):
         """Добавляет и удаляет рецепты в избранное."""
-        if request.method == "POST":
-            serializer = self.get_serializer(data=request.data)
-            if serializer.is_valid():
-                recipe = Recipe.objects.get(pk=pk)
-                if Favorite.objects.filter(recipe=recipe, user=request.user):
-                    return Response(
-                        {"errors": "Рецепт уже добавлен в избранное"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                serializer.save(user=self.request.user, recipe=recipe)
-                return Response(serializer.data,
-                                status=status.HTTP_201_CREATED)
-            return Response(serializer.errors,
-                            status=status.HTTP_400_BAD_REQUEST)
-        elif request.method == "DELETE":
-            favorite = Favorite.objects.filter(recipe=pk, user=request.user)
-            if favorite:
-                favorite.delete()
-                return Response(
-                    {"message": f"Рецепт {pk} удален из избранного"},
-                    status=status.HTTP_204_NO_CONTENT,
-                )
-            return Response(
-                {"errors": "Рецепт не добавлен в избранное"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+        return self.toggle(request, pk, Favorite, FAVORITE_MESSAGES)
 
     @action(
         detail=True,
@@ -135,62 +184,133 @@ class RecipesViewSet(viewsets.ModelViewSet):
     )
     def shopping_cart(self, request, pk=None):
         """Добавляет и удаляет рецепты в список покупок."""
+        return self.toggle(request, pk, ShoppingCart, SHOPPING_CART_MESSAGES)
+
+    def toggle_many(self, request, model):
+        """
+        Массовое добавление (POST) и удаление (DELETE) по списку id
+        из тела запроса {"recipes": [...]}, со статусом по каждому id.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = serializer.validated_data["recipes"]
         if request.method == "POST":
-            serializer = self.get_serializer(data=request.data)
-            if serializer.is_valid():
-                recipe = Recipe.objects.get(pk=pk)
-                if ShoppingCart.objects.filter(recipe=recipe,
-                                               user=request.user):
-                    return Response(
-                        {"errors": "Рецепт уже добавлен в список покупок"},
-                        status=status.HTTP_400_BAD_REQUEST,
-                    )
-                serializer.save(user=self.request.user, recipe=recipe)
-                return Response(serializer.data,
-                                status=status.HTTP_201_CREATED)
-            return Response(serializer.errors,
-                            status=status.HTTP_400_BAD_REQUEST)
-        elif request.method == "DELETE":
-            recipe = Recipe.objects.get(pk=pk)
-            shopping_cart = ShoppingCart.objects.filter(
-                recipe=recipe, user=request.user
-            )
-            if shopping_cart:
-                shopping_cart.delete()
-                return Response(
-                    {"message": f"Рецепт {pk} удален из списка покупок"},
-                    status=status.HTTP_204_NO_CONTENT,
-                )
-            return Response(
-                {"errors": "Рецепт не добавлен в список покупок"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-    @action(detail=False, methods=["get"],
-            permission_classes=(IsAuthenticated,))
+            results = model.objects.add_many(request.user, recipe_ids)
+        else:
+            results = model.objects.remove_many(request.user, recipe_ids)
+        return Response({"results": [
+            {"id": pk, "status": results[pk]} for pk in recipe_ids
+        ]})
+
+    @action(
+        detail=False,
+        url_path="favorite",
+        url_name="favorite-bulk",
+        methods=["post", "delete"],
+        permission_classes=(IsAuthenticated,),
+    )
+    def favorite_bulk(self, request):
+        """Добавляет и удаляет в избранное сразу несколько рецептов."""
+        return self.toggle_many(request, Favorite)
+
+    @action(
+        detail=False,
+        url_path="shopping_cart",
+        url_name="shopping-cart-bulk",
+        methods=["post", "delete"],
+        permission_classes=(IsAuthenticated,),
+    )
+    def shopping_cart_bulk(self, request):
+        """Добавляет и удаляет в список покупок сразу несколько рецептов."""
+        return self.toggle_many(request, ShoppingCart)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated,),
+    )
+    def feed(self, request):
+        """
+        Лента рецептов авторов, на которых подписан пользователь.
+        Читается из FeedItem по индексу, пагинация keyset (?cursor=).
+        """
+        paginator = KeysetPagination()
+        items = paginator.paginate_queryset(
+            FeedItem.objects.filter(user=request.user)
+            .order_by("-created", "-recipe_id"),
+            request, view=self,
+        )
+        recipes = self.get_queryset().in_bulk(
+            [item.recipe_id for item in items])
+        serializer = RecipeSerializer(
+            [recipes[item.recipe_id] for item in items
+             if item.recipe_id in recipes],
+            many=True, context=self.get_serializer_context(),
+        )
+        return paginator.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=["get"],
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(JSONRenderer, PDFRenderer, PlainTextRenderer,
+                          CSVRenderer),
+    )
     def download_shopping_cart(self, request):
-        """Качаем список покупок."""
-        return download_shopping_cart(self.request.user)
+        """Качаем список покупок: ?format=pdf|txt|csv|json."""
+        return download_shopping_cart(
+            self.request.user, request.query_params.get("format", "pdf")
+        )
 
+    def finalize_response(self, request, response, *args, **kwargs):
+        """
+        Ошибки при ?format=pdf|txt|csv отдаём как JSON и с типом JSON, а
+        не с типом файла, который выбрал рендерер.
+        """
+        if getattr(response, "exception", False) and isinstance(
+                getattr(request, "accepted_renderer", None),
+                ShoppingListRenderer):
+            request.accepted_renderer = JSONRenderer()
+            request.accepted_media_type = JSONRenderer.media_type
+        return super().finalize_response(request, response, *args, **kwargs)
 
-class IngredientViewSet(viewsets.ModelViewSet):
+
+class IngredientViewSet(VersionETagMixin, viewsets.ModelViewSet):
     """Чтение ингридиентов и фильтрация."""
 
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
+    authentication_classes = ()
     permission_classes = (ReadOnly,)
-    pagination_class = None
+    pagination_class = SearchLimitPagination
+    version_name = INGREDIENTS
+
+    def list(self, request, *args, **kwargs):
+        if (request.query_params.get("name")
+                and settings.INGREDIENT_SEARCH_IN_MEMORY):
+            return self.conditional(self.search, request)
+        return super().list(request, *args, **kwargs)
+
+    @staticmethod
+    def search(request):
+        """Автодополнение из индекса в памяти, без запросов к базе."""
+        return Response(
+            ingredient_index.search(request.query_params["name"],
+                                    settings.INGREDIENT_SEARCH_LIMIT)
+        )
 
 
-class TagViewSet(viewsets.ModelViewSet):
+class TagViewSet(VersionETagMixin, viewsets.ModelViewSet):
     """Чтение тегов."""
 
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     pagination_class = None
+    version_name = TAGS
 
+    authentication_classes = ()
     permission_classes = (ReadOnly,)
 
 
@@ -207,13 +327,14 @@ class CustomUserViewSet(UserViewSet):
 
     def get_serializer_context(self):
         context = super(UserViewSet, self).get_serializer_context()
-        followers = Follow.objects.all()
-        context.update({"follow": followers})
+        context.update({"follow": get_followed_authors(self.request.user)})
         return context
 
     def get_serializer_class(self):
         if self.action == "subscribe":
             return FollowSerializer
+        if self.action == "subscribe_bulk":
+            return AuthorIdsSerializer
         if self.request.method.lower() == "post":
             return UserCustomCreateSerializer
         return CustomUserSerializer
@@ -228,37 +349,57 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,),
     )
     def subscribe(self, request, id=None):
-        """Добавляет и удаляет пользователей в подписчики."""
+        """
+        Добавляет и удаляет пользователей в подписчики через follow_many
+        и unfollow_many: повторный запрос ничего не дублирует.
+        """
+        try:
+            author_id = int(id)
+        except ValueError:
+            raise Http404
         if request.method == "POST":
-            author = get_object_or_404(User, pk=id)
-            if request.user.id == int(id):
-                return Response(
-                    {"errors": "На самого себя не подписаться!"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            if request.user.follower.filter(user=author).exists():
-                return Response(
-                    {"errors": "Уже подписан!"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-            subs = request.user.follower.create(author=author)
+            result = Follow.objects.follow_many(
+                request.user, [author_id])[author_id]
+            if result == "not_found":
+                raise Http404
+            if result != "followed":
+                return Response({"errors": SUBSCRIBE_ERRORS[result]},
+                                status=status.HTTP_400_BAD_REQUEST)
+            subs = Follow.objects.with_recipes(
+                get_recipes_limit(request)
+            ).get(user=request.user, author_id=author_id)
             serializer = self.get_serializer(subs)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        result = Follow.objects.unfollow_many(
+            request.user, [author_id])[author_id]
+        if result == "missing":
+            return Response({"errors": SUBSCRIBE_ERRORS[result]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response({"message": "Вы отписались!"},
+                        status=status.HTTP_204_NO_CONTENT)
 
-        elif request.method == "DELETE":
-            user = request.user
-            author = get_object_or_404(User, pk=id)
-            follow = Follow.objects.filter(user=user, author=author)
-            if follow:
-                follow.delete()
-                return Response(
-                    {"message": "Вы отписались!"},
-                    status=status.HTTP_204_NO_CONTENT,
-                )
-            return Response(
-                {"errors": "Подписка отсутствует!"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
+    @action(
+        detail=False,
+        url_path="subscribe",
+        url_name="subscribe-bulk",
+        methods=["post", "delete"],
+        permission_classes=(IsAuthenticated,),
+    )
+    def subscribe_bulk(self, request):
+        """
+        Подписка (POST) и отписка (DELETE) сразу от нескольких авторов
+        по {"authors": [...]}, со статусом по каждому id.
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        author_ids = serializer.validated_data["authors"]
+        if request.method == "POST":
+            results = Follow.objects.follow_many(request.user, author_ids)
+        else:
+            results = Follow.objects.unfollow_many(request.user, author_ids)
+        return Response({"results": [
+            {"id": pk, "status": results[pk]} for pk in author_ids
+        ]})
 
 
 class AuthToken(ObtainAuthToken):
@@ -33,6 +33,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.middleware.RequestMetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -73,6 +74,21 @@ DATABASES = {
     }
 }
 
+# Кэш должен быть общим для всех воркеров: в docker-compose задан
+# REDIS_URL, без него (dev, тесты) — locmem в памяти процесса.
+REDIS_URL = os.getenv("REDIS_URL")
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv(
+            "CACHE_BACKEND",
+            default=("django_redis.cache.RedisCache" if REDIS_URL
+                     else "django.core.cache.backends.locmem.LocMemCache"),
+        ),
+        "LOCATION": os.getenv("CACHE_LOCATION",
+                              default=REDIS_URL or "foodgram"),
+    }
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         "NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator",
@@ -122,8 +138,58 @@ REST_FRAMEWORK = {
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "rest_framework.authentication.TokenAuthentication",
     ],
+    "DEFAULT_RENDERER_CLASSES": [
+        "api.renderers.TimedJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+}
+
+INGREDIENT_SEARCH_LIMIT = int(os.getenv("INGREDIENT_SEARCH_LIMIT",
+                                        default=50))
+INGREDIENT_SEARCH_CONTAINS = (
+    os.getenv("INGREDIENT_SEARCH_CONTAINS", default="True") == "True"
+)
+INGREDIENT_SEARCH_IN_MEMORY = (
+    os.getenv("INGREDIENT_SEARCH_IN_MEMORY", default="True") == "True"
+)
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv("RECIPE_CACHE_TIMEOUT", default=300))
+REFERENCE_DATA_MAX_AGE = int(os.getenv("REFERENCE_DATA_MAX_AGE", default=60))
+FEED_MAX_LENGTH = int(os.getenv("FEED_MAX_LENGTH", default=500))
+FEED_WORKERS = int(os.getenv("FEED_WORKERS", default=1))
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", default=4096))
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", default=2))
+IMAGE_MAX_UPLOAD_SIZE = int(os.getenv("IMAGE_MAX_UPLOAD_SIZE",
+                                      default=10 * 1024 * 1024))
+REQUEST_METRICS_SAMPLE_RATE = float(
+    os.getenv("REQUEST_METRICS_SAMPLE_RATE", default=1.0)
+)
+REQUEST_QUERY_THRESHOLD = int(os.getenv("REQUEST_QUERY_THRESHOLD",
+                                        default=50))
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", default="")
+METRICS_OBJECTS_TTL = int(os.getenv("METRICS_OBJECTS_TTL", default=300))
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "api.middleware": {
+            "handlers": ["console"],
+            "level": os.getenv("REQUEST_LOG_LEVEL", default="INFO"),
+            "propagate": False,
+        },
+    },
 }
 
+FILE_UPLOAD_HANDLERS = [
+    "api.uploads.MaxSizeUploadHandler",
+    "django.core.files.uploadhandler.MemoryFileUploadHandler",
+    "django.core.files.uploadhandler.TemporaryFileUploadHandler",
+]
+
 DJOSER = {
     "LOGIN_FIELD": "email",
     "SERIALIZERS": {
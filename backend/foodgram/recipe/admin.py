@@ -139,7 +139,7 @@ class RecipeAdmin(admin.ModelAdmin):
     get_ingredients.short_description = "Ингредиенты"
 
     def get_favorite_count(self, obj):
-        return obj.recipe_favorite.count()
+        return obj.favorites_count
 
     get_favorite_count.short_description = "В избранном"
 
@@ -180,10 +180,11 @@ class FavoriteAdmin(admin.ModelAdmin):
         "recipe",
         "user",
     )
+    list_select_related = ("recipe", "user")
     empty_value_display = EMPTY_MSG
 
     def get_count(self, obj):
-        return obj.recipe.recipe_favorite.count()
+        return obj.recipe.favorites_count
 
     get_count.short_description = "В избранных"
 
@@ -204,6 +205,7 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         "recipe",
         "user",
     )
+    list_select_related = ("recipe", "user")
     empty_value_display = EMPTY_MSG
 
     def get_recipe(self, obj):
@@ -212,6 +214,6 @@ class ShoppingCartAdmin(admin.ModelAdmin):
     get_recipe.short_description = "Рецепт"
 
     def get_count(self, obj):
-        return obj.recipe.recipe_favorite.count()
+        return obj.recipe.in_carts_count
 
-    get_count.short_description = "В избранных"
+    get_count.short_description = "В корзинах"
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class RecipeConfig(AppConfig):
     name = "recipe"
+
+    def ready(self):
+        from . import signals  # noqa: F401
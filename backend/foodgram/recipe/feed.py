@@ -0,0 +1,164 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, connections, transaction
+from django.db.models import Count, Q
+
+from .models import FeedItem, Follow, Recipe
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+
+executor = None
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def execute(sql, params):
+    """
+    Строки ленты создаются и удаляются запросами INSERT ... SELECT и
+    DELETE прямо в базе: через модели fan-out на тысячи подписчиков
+    упирается в создание объектов, а не в базу.
+    """
+    tables = {
+        "feed": FeedItem._meta.db_table,
+        "follow": Follow._meta.db_table,
+        "recipe": Recipe._meta.db_table,
+    }
+    with connection.cursor() as cursor:
+        cursor.execute(sql.format(**{
+            name: connection.ops.quote_name(table)
+            for name, table in tables.items()
+        }), params)
+
+
+def placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+
+def trim(user_ids):
+    """
+    Оставляет в лентах пользователей FEED_MAX_LENGTH последних записей:
+    один DELETE с ROW_NUMBER() на тех из пачки, у кого лента длиннее.
+    Ленте даём вырасти на десятую часть сверх предела, иначе каждый
+    новый рецепт удалял бы по строке у каждого подписчика.
+    """
+    max_length = settings.FEED_MAX_LENGTH
+    user_ids = list(
+        FeedItem.objects.filter(user_id__in=user_ids)
+        .values("user_id")
+        .annotate(length=Count("id"))
+        .filter(length__gt=max_length + max_length // 10)
+        .values_list("user_id", flat=True)
+    )
+    if not user_ids:
+        return
+    execute(
+        "DELETE FROM {feed} WHERE id IN ("
+        "SELECT id FROM (SELECT id, ROW_NUMBER() OVER ("
+        "PARTITION BY user_id ORDER BY created DESC, recipe_id DESC"
+        ") AS position FROM {feed} "
+        f"WHERE user_id IN ({placeholders(user_ids)})"
+        ") ranked WHERE position > %s)",
+        [*user_ids, max_length],
+    )
+
+
+def fan_out(recipe):
+    """Кладёт новый рецепт в ленты всех подписчиков автора пачками."""
+    followers = (
+        Follow.objects.filter(author_id=recipe.author_id)
+        .order_by("user_id")
+        .values_list("user_id", flat=True)
+    )
+    for user_ids in chunks(followers, BATCH_SIZE):
+        with transaction.atomic():
+            execute(
+                "INSERT INTO {feed} (user_id, recipe_id, author_id, created) "
+                "SELECT user_id, %s, author_id, %s FROM {follow} "
+                f"WHERE author_id = %s AND user_id IN "
+                f"({placeholders(user_ids)}) "
+                "ON CONFLICT (user_id, recipe_id) DO NOTHING",
+                [recipe.pk, recipe.created, recipe.author_id, *user_ids],
+            )
+            trim(user_ids)
+
+
+def process(recipe):
+    """Задача пула: fan_out нового рецепта, ошибки только в лог."""
+    try:
+        fan_out(recipe)
+    except Exception:
+        logger.exception("Не удалось разослать рецепт %s в ленты", recipe.pk)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=settings.FEED_WORKERS,
+                                      thread_name_prefix="recipe-feed")
+    return executor
+
+
+def schedule_fan_out(recipe):
+    """
+    После коммита отдаём рецепт в фоновый пул: у популярного автора
+    fan_out — тысячи строк, ответ на создание рецепта их не ждёт.
+    """
+    transaction.on_commit(lambda: get_executor().submit(process, recipe))
+
+
+def backfill(follows):
+    """
+    Наполняет ленты после подписки последними FEED_MAX_LENGTH рецептами
+    каждого автора, лишнее в ленте срезает trim. follows — пары
+    (user_id, author_id); берутся все подписки между этими
+    пользователями и авторами, лишних строк это не даёт.
+    """
+    if not follows:
+        return
+    user_ids = sorted({user_id for user_id, _ in follows})
+    author_ids = sorted({author_id for _, author_id in follows})
+    with transaction.atomic():
+        execute(
+            "INSERT INTO {feed} (user_id, recipe_id, author_id, created) "
+            "SELECT follow.user_id, recipe.id, recipe.author_id, "
+            "recipe.created FROM {follow} follow "
+            "INNER JOIN (SELECT id, author_id, created, ROW_NUMBER() OVER ("
+            "PARTITION BY author_id ORDER BY created DESC, id DESC"
+            ") AS position FROM {recipe} "
+            f"WHERE author_id IN ({placeholders(author_ids)})"
+            ") recipe ON recipe.author_id = follow.author_id "
+            f"WHERE follow.user_id IN ({placeholders(user_ids)}) "
+            f"AND follow.author_id IN ({placeholders(author_ids)}) "
+            "AND recipe.position <= %s "
+            "ON CONFLICT (user_id, recipe_id) DO NOTHING",
+            [*author_ids, *user_ids, *author_ids,
+             settings.FEED_MAX_LENGTH],
+        )
+        for batch in chunks(user_ids, BATCH_SIZE):
+            trim(batch)
+
+
+def remove(follows):
+    """Убирает из лент рецепты авторов после отписки, пары (user, author)."""
+    authors = {}
+    for user_id, author_id in follows:
+        authors.setdefault(user_id, []).append(author_id)
+    condition = Q()
+    for user_id, author_ids in authors.items():
+        condition |= Q(user_id=user_id, author_id__in=author_ids)
+    if condition:
+        FeedItem.objects.filter(condition).delete()
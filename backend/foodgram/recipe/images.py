@@ -0,0 +1,125 @@
+import io
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.db import connections, transaction
+from PIL import Image, ImageOps, features
+
+from .models import Recipe
+from .versions import RECIPES, bump_version, recipe_version
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = {
+    "thumbnail": (240, 240),
+    "card": (640, 640),
+}
+FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+if not features.check("webp"):
+    del FORMATS["webp"]
+
+executor = None
+
+
+def check_dimensions(image):
+    """
+    Размеры берутся из заголовка файла, сами пиксели ещё не
+    распакованы: огромную картинку отклоняем до декодирования.
+    """
+    width, height = image.size
+    if max(width, height) > settings.IMAGE_MAX_DIMENSION:
+        raise ValidationError(
+            f"Изображение {width}x{height} больше допустимого: "
+            f"не больше {settings.IMAGE_MAX_DIMENSION} точек по стороне."
+        )
+
+
+def variant_name(name, variant, extension):
+    stem = os.path.splitext(os.path.basename(name))[0]
+    return f"recipe/variants/{stem}-{variant}.{extension}"
+
+
+def to_rgb(image):
+    """JPEG не умеет прозрачность: подкладываем белый фон."""
+    image = ImageOps.exif_transpose(image)
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+        return background
+    return image.convert("RGB")
+
+
+def make_variants(name):
+    """Нарезает уменьшенные копии, возвращает {вариант: {формат: имя}}."""
+    storage = Recipe._meta.get_field("image").storage
+    variants = {}
+    with storage.open(name) as file, Image.open(file) as image:
+        check_dimensions(image)
+        # JPEG умеет декодироваться сразу в уменьшенном масштабе.
+        image.draft("RGB", max(VARIANTS.values()))
+        image = to_rgb(image)
+        for variant, size in VARIANTS.items():
+            resized = image.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            for extension, (image_format, params) in FORMATS.items():
+                buffer = io.BytesIO()
+                resized.save(buffer, image_format, **params)
+                variants.setdefault(variant, {})[extension] = storage.save(
+                    variant_name(name, variant, extension),
+                    ContentFile(buffer.getvalue()),
+                )
+    return variants
+
+
+def process(recipe_id, name):
+    """
+    Задача пула: копии сохраняются, только если у рецепта всё ещё то же
+    изображение. update() не шлёт сигналов, поэтому версию рецепта
+    для кэша меняем сами.
+    """
+    try:
+        variants = make_variants(name)
+        updated = Recipe.objects.filter(pk=recipe_id, image=name).update(
+            image_variants={"source": name, **variants})
+        if updated:
+            bump_version(RECIPES, recipe_version(recipe_id))
+    except Exception:
+        logger.exception("Не удалось нарезать изображение %s", name)
+    finally:
+        connections.close_all()
+
+
+def get_executor():
+    global executor
+    if executor is None:
+        executor = ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS,
+                                      thread_name_prefix="recipe-images")
+    return executor
+
+
+def schedule_variants(recipe):
+    """После коммита отдаём новое изображение рецепта в фоновый пул."""
+    name = recipe.image.name
+    if not name or recipe.image_variants.get("source") == name:
+        return
+    transaction.on_commit(
+        lambda: get_executor().submit(process, recipe.pk, name))
+
+
+def get_variant_urls(recipe):
+    """Ссылки на готовые копии; пока их нет — пустой словарь."""
+    storage = Recipe._meta.get_field("image").storage
+    return {
+        variant: {extension: storage.url(name)
+                  for extension, name in names.items()}
+        for variant, names in recipe.image_variants.items()
+        if variant in VARIANTS
+    }
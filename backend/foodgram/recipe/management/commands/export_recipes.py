@@ -0,0 +1,83 @@
+import json
+import sys
+
+from django.core.management import BaseCommand
+
+from recipe.models import IngredientRecipe, Recipe
+
+
+def group_by_recipe(rows):
+    grouped = {}
+    for recipe_id, *values in rows:
+        grouped.setdefault(recipe_id, []).append(values)
+    return grouped
+
+
+class Command(BaseCommand):
+    help = (
+        "Выгрузка рецептов в JSONL, по рецепту в строке: автор (email), "
+        "тэги (slug), ингредиенты (название, единица, количество) и путь "
+        "к картинке. Файл читает import_recipes"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", nargs="?", default="-",
+                            help="Файл выгрузки, по умолчанию stdout")
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options["path"] == "-":
+            self.export(sys.stdout, options["batch_size"])
+        else:
+            with open(options["path"], "w", encoding="utf-8") as file:
+                count = self.export(file, options["batch_size"])
+            self.stdout.write(self.style.SUCCESS(
+                f"Выгружено рецептов: {count}."))
+
+    def export(self, file, batch_size):
+        """
+        Пачки идут по возрастанию pk, OFFSET на больших таблицах
+        медленный. На пачку три запроса values_list: объекты моделей и
+        prefetch_related на сотнях тысяч строк съедают почти всё время.
+        """
+        last_pk, count = 0, 0
+        while True:
+            recipes = list(
+                Recipe.objects.filter(pk__gt=last_pk).order_by("pk")
+                .values_list("pk", "name", "text", "cooking_time",
+                             "author__email", "image")[:batch_size]
+            )
+            if not recipes:
+                return count
+            for record in self.to_records(recipes):
+                file.write(json.dumps(record, ensure_ascii=False))
+                file.write("\n")
+            count += len(recipes)
+            last_pk = recipes[-1][0]
+
+    def to_records(self, recipes):
+        pks = [recipe[0] for recipe in recipes]
+        tags = group_by_recipe(
+            Recipe.tags.through.objects.filter(recipe_id__in=pks)
+            .order_by("pk").values_list("recipe_id", "tag__slug")
+        )
+        ingredients = group_by_recipe(
+            IngredientRecipe.objects.filter(recipe_id__in=pks)
+            .order_by("pk").values_list(
+                "recipe_id", "ingredient__name",
+                "ingredient__measurement_unit", "amount")
+        )
+        for pk, name, text, cooking_time, author, image in recipes:
+            yield {
+                "name": name,
+                "text": text,
+                "cooking_time": cooking_time,
+                "author": author,
+                "image": image or None,
+                "tags": [slug for slug, in tags.get(pk, ())],
+                "ingredients": [
+                    {"name": ingredient, "measurement_unit": unit,
+                     "amount": amount}
+                    for ingredient, unit, amount in ingredients.get(pk, ())
+                ],
+            }
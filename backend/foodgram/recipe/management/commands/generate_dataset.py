@@ -0,0 +1,213 @@
+import io
+import random
+import time
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.management import BaseCommand, call_command
+from django.db import transaction
+from django.db.models import Max
+from PIL import Image
+
+from recipe import feed, images
+from recipe.models import (Favorite, Follow, Ingredient, IngredientRecipe,
+                           Recipe, ShoppingCart, Tag, User)
+from recipe.versions import INGREDIENTS, RECIPES, bump_version
+
+PREFIX = "synthetic"
+PASSWORD = "Pan-Cake-2024"
+IMAGE_NAME = f"recipe/{PREFIX}.jpg"
+
+
+def create(model, objects):
+    """
+    bulk_create и pk новых строк по порядку. На SQLite bulk_create pk не
+    возвращает, поэтому берём всё, что выше прежнего максимума:
+    генератор не рассчитан на параллельную запись в те же таблицы.
+    """
+    last = model.objects.aggregate(last=Max("pk"))["last"] or 0
+    model.objects.bulk_create(objects)
+    return list(
+        model.objects.filter(pk__gt=last).order_by("pk")
+        .values_list("pk", flat=True)
+    )
+
+
+class Zipf:
+    """Выбор с весами 1/rank**alpha: немногие популярны, хвост длинный."""
+
+    def __init__(self, rng, population, alpha):
+        self.rng = rng
+        self.population = population
+        self.cum_weights = list(accumulate(
+            1 / (rank + 1) ** alpha for rank in range(len(population))))
+
+    def choice(self):
+        return self.rng.choices(self.population,
+                                cum_weights=self.cum_weights)[0]
+
+    def sample(self, count):
+        """До count разных элементов (повторы выбора отбрасываются)."""
+        if not self.population:
+            return set()
+        return set(self.rng.choices(self.population,
+                                    cum_weights=self.cum_weights, k=count))
+
+
+class Command(BaseCommand):
+    help = (
+        "Синтетические данные для замеров: пользователи, подписки со "
+        "степенным распределением подписчиков, рецепты с тэгами и 5–40 "
+        "ингредиентами, избранное и корзины. Один --seed — одни данные. "
+        f"Пароль всех пользователей: {PASSWORD}"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--authors", type=int, default=100,
+                            help="Сколько пользователей пишут рецепты")
+        parser.add_argument("--recipes", type=int, default=5000)
+        parser.add_argument("--follows", type=int, default=20,
+                            help="Подписок на пользователя в среднем")
+        parser.add_argument("--favorites", type=int, default=10,
+                            help="Избранного на пользователя в среднем")
+        parser.add_argument("--carts", type=int, default=3,
+                            help="Рецептов в корзине в среднем")
+        parser.add_argument("--alpha", type=float, default=1.1,
+                            help="Показатель степенного распределения")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        start = time.perf_counter()
+        users = self.create_users(options["users"])
+        authors = users[:max(1, min(options["authors"], len(users)))]
+        recipes = self.create_recipes(
+            options["recipes"], Zipf(self.rng, authors, options["alpha"]))
+        self.create_follows(users, Zipf(self.rng, authors, options["alpha"]),
+                            options["follows"])
+        recipe_zipf = Zipf(self.rng, recipes, options["alpha"])
+        for model, average in ((Favorite, options["favorites"]),
+                               (ShoppingCart, options["carts"])):
+            self.create_user_recipes(model, users, recipe_zipf, average)
+        self.update_counters(recipes)
+        bump_version(RECIPES, INGREDIENTS)
+        self.stdout.write(self.style.SUCCESS(
+            f"Данные созданы за {time.perf_counter() - start:.1f} с: "
+            f"пользователей {len(users)}, авторов {len(authors)}, "
+            f"рецептов {len(recipes)}."
+        ))
+
+    def create_users(self, count):
+        offset = User.objects.filter(username__startswith=PREFIX).count()
+        # Хэш пароля один на всех: PBKDF2 на каждого занял бы минуты.
+        password = make_password(PASSWORD)
+        pks = []
+        for batch in feed.chunks(range(offset, offset + count),
+                                 self.batch_size):
+            pks += create(User, [
+                User(username=f"{PREFIX}-{index}",
+                     email=f"{PREFIX}-{index}@example.com",
+                     first_name="Синтетический", last_name=str(index),
+                     password=password)
+                for index in batch
+            ])
+        self.stdout.write(f"Пользователей: {len(pks)}")
+        return pks
+
+    def get_tags(self):
+        if not Tag.objects.exists():
+            call_command("load_tags", stdout=self.stdout)
+        return list(Tag.objects.order_by("pk").values_list("pk", flat=True))
+
+    def get_ingredients(self):
+        """В рецепте до 40 ингредиентов: пустой справочник добиваем до 200."""
+        existing = Ingredient.objects.count()
+        if existing < 200:
+            Ingredient.objects.bulk_create(
+                (Ingredient(name=f"{PREFIX}-{index}", measurement_unit="г")
+                 for index in range(existing, 200)),
+                ignore_conflicts=True,
+            )
+        return list(
+            Ingredient.objects.order_by("pk").values_list("pk", flat=True))
+
+    def get_image(self):
+        """Одна картинка с копиями на все рецепты: API ждёт её у каждого."""
+        storage = Recipe._meta.get_field("image").storage
+        if not storage.exists(IMAGE_NAME):
+            buffer = io.BytesIO()
+            Image.new("RGB", (1200, 800), "#E26C2D").save(buffer, "JPEG")
+            storage.save(IMAGE_NAME, ContentFile(buffer.getvalue()))
+        return {"source": IMAGE_NAME, **images.make_variants(IMAGE_NAME)}
+
+    def create_recipes(self, count, authors):
+        tags = self.get_tags()
+        ingredients = self.get_ingredients()
+        variants = self.get_image()
+        pks = []
+        for batch in feed.chunks(range(count), self.batch_size):
+            with transaction.atomic():
+                new = create(Recipe, [
+                    Recipe(name=f"Рецепт {index}", text=f"Описание {index}",
+                           cooking_time=self.rng.randint(5, 180),
+                           author_id=authors.choice(), image=IMAGE_NAME,
+                           image_variants=variants)
+                    for index in batch
+                ])
+                Recipe.tags.through.objects.bulk_create(
+                    Recipe.tags.through(recipe_id=recipe, tag_id=tag)
+                    for recipe in new
+                    for tag in self.rng.sample(
+                        tags, self.rng.randint(1, len(tags)))
+                )
+                IngredientRecipe.objects.bulk_create(
+                    IngredientRecipe(recipe_id=recipe, ingredient_id=item,
+                                     amount=self.rng.randint(1, 500))
+                    for recipe in new
+                    for item in self.rng.sample(
+                        ingredients, self.rng.randint(5, 40))
+                )
+            pks += new
+            self.stdout.write(f"Рецептов: {len(pks)}")
+        return pks
+
+    def random_count(self, average):
+        return self.rng.randint(0, 2 * average)
+
+    def create_follows(self, users, authors, average):
+        """Подписки и сразу ленты: сигналы bulk_create не шлёт."""
+        for batch in feed.chunks(users, self.batch_size):
+            follows = [
+                (user, author)
+                for user in batch
+                for author in authors.sample(self.random_count(average))
+                if author != user
+            ]
+            with transaction.atomic():
+                Follow.objects.bulk_create(
+                    (Follow(user_id=user, author_id=author)
+                     for user, author in follows),
+                    ignore_conflicts=True,
+                )
+                for pairs in feed.chunks(follows, feed.BATCH_SIZE):
+                    feed.backfill(pairs)
+        self.stdout.write(f"Подписок: {Follow.objects.count()}")
+
+    def create_user_recipes(self, model, users, recipes, average):
+        for batch in feed.chunks(users, self.batch_size):
+            model.objects.bulk_create(
+                (model(user_id=user, recipe_id=recipe)
+                 for user in batch
+                 for recipe in recipes.sample(self.random_count(average))),
+                ignore_conflicts=True,
+            )
+        self.stdout.write(
+            f"{model._meta.verbose_name_plural}: {model.objects.count()}")
+
+    def update_counters(self, recipes):
+        for batch in feed.chunks(recipes, self.batch_size):
+            Recipe.objects.filter(pk__in=batch).update_counters()
@@ -0,0 +1,113 @@
+import csv
+import json
+from itertools import islice
+
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+
+from recipe.models import Follow, User, follows_created
+
+
+def get_edge(row):
+    """
+    Пара (user, author) из строки файла. Некорректная строка даёт
+    (None, None): import_batch посчитает её пропущенной.
+    """
+    try:
+        return row["user"], row["author"]
+    except (KeyError, TypeError):
+        return None, None
+
+
+def read_csv(file):
+    for row in csv.DictReader(file):
+        yield get_edge(row)
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield get_edge(row)
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl}
+
+
+class Command(BaseCommand):
+    help = (
+        "Загрузка подписок из CSV (колонки user,author) или JSONL "
+        '({"user": id, "author": id} в строке) пачками'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=READERS, default=None)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f"Не знаю формат {file_format}, укажите --format csv|jsonl"
+            )
+        read, skipped = 0, 0
+        with open(path, encoding="utf-8", newline="") as file:
+            edges = READERS[file_format](file)
+            while True:
+                batch = list(islice(edges, options["batch_size"]))
+                if not batch:
+                    break
+                read += len(batch)
+                skipped += len(batch) - self.import_batch(batch)
+                self.stdout.write(f"Обработано {read} подписок...")
+        self.stdout.write(self.style.SUCCESS(
+            f"Загрузка подписок завершена! Прочитано: {read}, "
+            f"пропущено (некорректные, повторы и уже существующие): "
+            f"{skipped}, "
+            f"всего подписок в базе: {Follow.objects.count()}."
+        ))
+
+    @staticmethod
+    def import_batch(batch):
+        """
+        Отбрасываем подписки на себя, на несуществующих пользователей
+        (bulk_create их не пропустит) и уже существующие; параллельно
+        добавленные отсекает ignore_conflicts. Ленты подписчиков
+        наполняются сразу же. Возвращает число новых подписок.
+        """
+        edges = set()
+        for user, author in batch:
+            try:
+                user, author = int(user), int(author)
+            except (TypeError, ValueError):
+                continue
+            if user != author:
+                edges.add((user, author))
+        user_ids = {pk for edge in edges for pk in edge}
+        users = set(
+            User.objects.filter(pk__in=user_ids).values_list("pk", flat=True)
+        )
+        present = set(
+            Follow.objects.filter(
+                user_id__in={user for user, _ in edges},
+                author_id__in={author for _, author in edges},
+            ).values_list("user_id", "author_id")
+        )
+        follows = [
+            (user, author) for user, author in edges
+            if user in users and author in users
+            and (user, author) not in present
+        ]
+        with transaction.atomic():
+            Follow.objects.bulk_create(
+                (Follow(user_id=user, author_id=author)
+                 for user, author in follows),
+                ignore_conflicts=True,
+            )
+            follows_created.send(sender=Follow, pairs=follows)
+        return len(follows)
@@ -0,0 +1,217 @@
+import json
+import multiprocessing
+import time
+from itertools import islice
+
+from django.core.management import BaseCommand
+from django.db import connection, connections, transaction
+from django.db.models import Max
+
+from recipe import feed, images
+from recipe.models import (Follow, Ingredient, IngredientRecipe, Recipe,
+                           Tag, User)
+from recipe.versions import RECIPES, bump_version
+
+# Верхняя граница PositiveSmallIntegerField.
+SMALL_INTEGER_MAX = 32767
+
+
+def decode_image(name):
+    """
+    Проверка картинки и нарезка уменьшенных копий. Работает и в
+    отдельном процессе: базу не трогает, только хранилище файлов.
+    """
+    try:
+        return {"source": name, **images.make_variants(name)}
+    except Exception:
+        return None
+
+
+def small_integer(value):
+    """
+    Время приготовления и количество: вне 1..32767 рецепт пропускается,
+    иначе база отвергла бы вставку всей пачки.
+    """
+    value = int(value)
+    if not 1 <= value <= SMALL_INTEGER_MAX:
+        raise ValueError(f"{value} вне 1..{SMALL_INTEGER_MAX}")
+    return value
+
+
+def read_jsonl(file):
+    for line in file:
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError:
+                yield None
+
+
+class Command(BaseCommand):
+    help = (
+        "Загрузка рецептов из JSONL (формат export_recipes) пачками через "
+        "bulk_create. Авторы ищутся по email, тэги по slug, ингредиенты по "
+        "названию и единице измерения; рецепт с неизвестной ссылкой "
+        "пропускается. Картинки должны уже лежать в MEDIA_ROOT. Повторный "
+        "запуск создаст рецепты ещё раз"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--workers", type=int, default=0,
+            help="Процессов для нарезки картинок, 0 — в этом процессе",
+        )
+        parser.add_argument(
+            "--skip-images", action="store_true",
+            help="Не нарезать копии картинок (make_image_variants позже)",
+        )
+
+    def handle(self, *args, **options):
+        self.load_maps()
+        self.skip_images = options["skip_images"]
+        self.counts = {"imported": 0, "skipped": 0, "broken_images": 0}
+        self.author_ids = set()
+        pool = None
+        if options["workers"] and not self.skip_images:
+            # Дочерние процессы не должны унаследовать открытые соединения.
+            connections.close_all()
+            pool = multiprocessing.Pool(options["workers"])
+        self.map = pool.map if pool else map
+        start = time.perf_counter()
+        try:
+            with open(options["path"], encoding="utf-8") as file:
+                records = read_jsonl(file)
+                while True:
+                    batch = list(islice(records, options["batch_size"]))
+                    if not batch:
+                        break
+                    self.import_batch(batch)
+                    self.stdout.write(
+                        f"Загружено {self.counts['imported']} рецептов...")
+        finally:
+            if pool:
+                pool.close()
+                pool.join()
+        self.update_feeds()
+        if self.counts["imported"]:
+            bump_version(RECIPES)
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Рецепты загружены! Добавлено: {self.counts['imported']}, "
+            f"пропущено: {self.counts['skipped']}, "
+            f"картинок с ошибкой: {self.counts['broken_images']}. "
+            f"{elapsed:.1f} с."
+        ))
+
+    def load_maps(self):
+        """Тэги и ингредиенты целиком в памяти: их немного."""
+        self.tags = dict(Tag.objects.values_list("slug", "pk"))
+        self.ingredients = {}
+        self.ingredients_by_name = {}
+        for pk, name, unit in Ingredient.objects.values_list(
+            "pk", "name", "measurement_unit"
+        ).iterator():
+            self.ingredients[(name, unit)] = pk
+            # Название без единицы однозначно, только если единица одна.
+            self.ingredients_by_name[name] = (
+                None if name in self.ingredients_by_name else pk)
+
+    def get_ingredient(self, item):
+        if item.get("measurement_unit"):
+            return self.ingredients[(item["name"], item["measurement_unit"])]
+        pk = self.ingredients_by_name[item["name"]]
+        if pk is None:
+            raise KeyError(item["name"])
+        return pk
+
+    def parse(self, record, authors):
+        """Рецепт, pk тэгов и пары (pk ингредиента, количество)."""
+        recipe = Recipe(
+            name=str(record["name"])[:256],
+            text=str(record["text"]),
+            cooking_time=small_integer(record["cooking_time"]),
+            author_id=authors[record["author"]],
+            image=record.get("image") or None,
+        )
+        tags = {self.tags[slug] for slug in record.get("tags", ())}
+        amounts = {}
+        for item in record["ingredients"]:
+            amounts[self.get_ingredient(item)] = small_integer(
+                item["amount"])
+        return recipe, tags, amounts
+
+    def import_batch(self, batch):
+        authors = dict(
+            User.objects.filter(
+                email__in={
+                    record.get("author") for record in batch
+                    if isinstance(record, dict)
+                }
+            ).values_list("email", "pk")
+        )
+        parsed = []
+        for record in batch:
+            try:
+                parsed.append(self.parse(record, authors))
+            except (KeyError, TypeError, ValueError):
+                self.counts["skipped"] += 1
+        if not parsed:
+            return
+        self.attach_variants([recipe for recipe, _, _ in parsed])
+        with transaction.atomic():
+            self.create_recipes([recipe for recipe, _, _ in parsed])
+            Recipe.tags.through.objects.bulk_create(
+                Recipe.tags.through(recipe_id=recipe.pk, tag_id=tag)
+                for recipe, tags, _ in parsed for tag in tags
+            )
+            IngredientRecipe.objects.bulk_create(
+                IngredientRecipe(recipe_id=recipe.pk, ingredient_id=pk,
+                                 amount=amount)
+                for recipe, _, amounts in parsed
+                for pk, amount in amounts.items()
+            )
+        self.counts["imported"] += len(parsed)
+        self.author_ids.update(recipe.author_id for recipe, _, _ in parsed)
+
+    def attach_variants(self, recipes):
+        """
+        bulk_create не шлёт post_save, и фоновый пул картинок не
+        сработает: копии нарезаем здесь, при --workers — в процессах.
+        """
+        if self.skip_images:
+            return
+        with_image = [recipe for recipe in recipes if recipe.image]
+        variants = self.map(
+            decode_image, [recipe.image.name for recipe in with_image])
+        for recipe, recipe_variants in zip(with_image, variants):
+            if recipe_variants is None:
+                self.counts["broken_images"] += 1
+            else:
+                recipe.image_variants = recipe_variants
+
+    def create_recipes(self, recipes):
+        """
+        SQLite не возвращает pk из bulk_create, а они нужны для тэгов и
+        ингредиентов: там раздаём pk сами, подряд за последним. Запись
+        идёт в транзакции, параллельная вставка получит IntegrityError,
+        а не перепутанные рецепты.
+        """
+        if not connection.features.can_return_rows_from_bulk_insert:
+            last = Recipe.objects.aggregate(last=Max("pk"))["last"] or 0
+            for pk, recipe in enumerate(recipes, last + 1):
+                recipe.pk = pk
+        Recipe.objects.bulk_create(recipes)
+
+    def update_feeds(self):
+        """Ленты подписчиков: сигнал о новом рецепте тоже не пришёл."""
+        for author_ids in feed.chunks(sorted(self.author_ids),
+                                      feed.BATCH_SIZE):
+            follows = (
+                Follow.objects.filter(author_id__in=author_ids)
+                .order_by("user_id")
+                .values_list("user_id", "author_id")
+            )
+            for batch in feed.chunks(follows, feed.BATCH_SIZE):
+                feed.backfill(batch)
@@ -1,19 +1,138 @@
 import csv
+import json
+import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management import BaseCommand
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
 
 from recipe.models import Ingredient
+from recipe.versions import INGREDIENTS, bump_version
+
+HEADER = ["name", "measurement_unit"]
+CHUNK_SIZE = 64 * 1024
+
+
+def read_csv(file):
+    """Строки name,measurement_unit; заголовок, если он есть, пропускаем."""
+    for index, row in enumerate(csv.reader(file)):
+        if index == 0 and row == HEADER:
+            continue
+        yield row[0] if row else "", row[1] if len(row) > 1 else ""
+
+
+def read_json(file):
+    """
+    Массив [{"name": ..., "measurement_unit": ...}, ...] читается по
+    кускам и разбирается по одному объекту, весь файл в память не
+    попадает. Строки JSONL (по объекту в строке) тоже подходят.
+    Элементы, которые не объекты, считаются пропущенными.
+    """
+    decoder = json.JSONDecoder()
+    buffer, position = "", 0
+    while True:
+        chunk = file.read(CHUNK_SIZE)
+        buffer = buffer[position:] + chunk
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position] in "[], \r\n\t":
+                position += 1
+            try:
+                item, position = decoder.raw_decode(buffer, position)
+            except ValueError:
+                break
+            if not isinstance(item, dict):
+                # Не объект: пустая пара уйдёт в пропущенные.
+                item = {}
+            yield item.get("name", ""), item.get("measurement_unit", "")
+        if not chunk:
+            if buffer[position:].strip():
+                raise CommandError("Файл JSON обрывается на середине.")
+            return
+
+
+READERS = {"csv": read_csv, "json": read_json, "jsonl": read_json}
 
 
 class Command(BaseCommand):
-    help = "Загрузка из csv файла"
+    help = (
+        "Загрузка ингредиентов из csv или json пачками. Повторный запуск "
+        "ничего не дублирует: ключ — название и единица измерения"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?",
+            default=os.path.join(settings.BASE_DIR, "data", "ingredients.csv"),
+        )
+        parser.add_argument("--format", choices=READERS, default=None)
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        file_format = options["format"] or path.rsplit(".", 1)[-1].lower()
+        if file_format not in READERS:
+            raise CommandError(
+                f"Не знаю формат {file_format}, укажите --format csv|json"
+            )
+        self.max_lengths = {
+            field: Ingredient._meta.get_field(field).max_length
+            for field in HEADER
+        }
+        counts = {"inserted": 0, "existing": 0, "skipped": 0}
+        start = time.perf_counter()
+        with open(path, encoding="utf-8", newline="") as file:
+            rows = READERS[file_format](file)
+            while True:
+                batch = list(islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                for key, count in self.load_batch(batch).items():
+                    counts[key] += count
+        if counts["inserted"]:
+            bump_version(INGREDIENTS)
+        total = sum(counts.values())
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f"Ингредиенты загружены! Добавлено: {counts['inserted']}, "
+            f"уже были: {counts['existing']}, "
+            f"пропущено (пустые, длинные, повторы): {counts['skipped']}. "
+            f"{total} строк за {elapsed:.1f} с "
+            f"({total / elapsed if elapsed else total:.0f} строк/с)."
+        ))
+
+    def is_valid(self, name, measurement_unit):
+        return (0 < len(name) <= self.max_lengths["name"]
+                and 0 < len(measurement_unit)
+                <= self.max_lengths["measurement_unit"])
 
-    def handle(self, *args, **kwargs):
-        data_path = settings.BASE_DIR
-        with open(f"{data_path}/data/ingredients.csv", "r",
-                  encoding="utf-8") as file:
-            reader = csv.DictReader(file)
+    def load_batch(self, batch):
+        """
+        Один SELECT по названиям пачки отделяет уже загруженные, остальное
+        уходит одним bulk_create(ignore_conflicts=True): гонку с другим
+        загрузчиком отсечёт уникальное ограничение.
+        """
+        keys = {}
+        for name, measurement_unit in batch:
+            key = (str(name).strip(), str(measurement_unit).strip())
+            if self.is_valid(*key):
+                keys.setdefault(key, None)
+        existing = set(
+            Ingredient.objects.filter(
+                name__in={name for name, _ in keys}
+            ).values_list("name", "measurement_unit")
+        )
+        new = [key for key in keys if key not in existing]
+        with transaction.atomic():
             Ingredient.objects.bulk_create(
-                Ingredient(**data) for data in reader)
-        self.stdout.write(self.style.SUCCESS("Все ингридиенты загружены!"))
+                [Ingredient(name=name, measurement_unit=measurement_unit)
+                 for name, measurement_unit in new],
+                ignore_conflicts=True,
+            )
+        return {
+            "inserted": len(new),
+            "existing": len(keys) - len(new),
+            "skipped": len(batch) - len(keys),
+        }
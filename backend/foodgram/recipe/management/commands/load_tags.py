@@ -1,6 +1,7 @@
 from django.core.management import BaseCommand
 
 from recipe.models import Tag
+from recipe.versions import TAGS, bump_version
 
 
 class Command(BaseCommand):
@@ -13,4 +14,5 @@ class Command(BaseCommand):
             {"name": "Ужин", "color": "#8775D2", "slug": "supper"},
         ]
         Tag.objects.bulk_create(Tag(**tag) for tag in data)
+        bump_version(TAGS)
         self.stdout.write(self.style.SUCCESS("Все тэги загружены!"))
@@ -0,0 +1,25 @@
+from django.core.management import BaseCommand
+
+from recipe.images import process
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Нарезка уменьшенных копий изображений рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--all", action="store_true",
+                            help="Пересоздать копии и у готовых рецептов")
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.exclude(image="").exclude(image=None)
+        if not options["all"]:
+            recipes = recipes.filter(image_variants={})
+        count = 0
+        for pk, name in recipes.values_list("pk", "image").iterator():
+            process(pk, name)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(f"Копии изображений нарезаны у {count} "
+                               f"рецептов!")
+        )
@@ -0,0 +1,23 @@
+from django.core.management import BaseCommand
+from django.db.models import Max
+
+from recipe.models import Recipe
+
+
+class Command(BaseCommand):
+    help = "Пересчёт счётчиков избранного и корзин у рецептов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        last_pk = Recipe.objects.aggregate(last=Max("pk"))["last"] or 0
+        updated = 0
+        for start in range(0, last_pk + 1, batch_size):
+            updated += Recipe.objects.filter(
+                pk__gte=start, pk__lt=start + batch_size
+            ).update_counters()
+        self.stdout.write(
+            self.style.SUCCESS(f"Счётчики пересчитаны у {updated} рецептов!")
+        )
@@ -0,0 +1,19 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipe", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="shoppingcart",
+            index=models.Index(
+                fields=["user", "recipe"], name="shoppingcart_user_recipe_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,36 @@
+from django.db import migrations
+
+CREATE_SQL = (
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS recipe_ingredient_name_prefix_idx "
+    "ON recipe_ingredient (lower(name) text_pattern_ops)",
+    "CREATE INDEX IF NOT EXISTS recipe_ingredient_name_trgm_idx "
+    "ON recipe_ingredient USING gin (lower(name) gin_trgm_ops)",
+)
+DROP_SQL = (
+    "DROP INDEX IF EXISTS recipe_ingredient_name_trgm_idx",
+    "DROP INDEX IF EXISTS recipe_ingredient_name_prefix_idx",
+)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipe", "0002_shoppingcart_user_recipe_idx"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_SQL), run_on_postgresql(DROP_SQL)
+        ),
+    ]
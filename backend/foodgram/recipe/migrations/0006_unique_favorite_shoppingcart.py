@@ -0,0 +1,63 @@
+# Generated by Django 3.2.15 on 2026-10-18 02:40
+
+from django.db import migrations, models
+from django.db.models import Count, Min, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def remove_duplicates(apps, schema_editor):
+    """Оставляем первую строку каждой пары (user, recipe)."""
+    Recipe = apps.get_model("recipe", "Recipe")
+    for model_name, counter in (("Favorite", "favorites_count"),
+                                ("ShoppingCart", "in_carts_count")):
+        model = apps.get_model("recipe", model_name)
+        duplicates = (
+            model.objects.values("user", "recipe")
+            .annotate(first=Min("pk"), count=Count("pk"))
+            .filter(count__gt=1)
+        )
+        recipe_ids = set()
+        for duplicate in duplicates:
+            model.objects.filter(
+                user=duplicate["user"], recipe=duplicate["recipe"]
+            ).exclude(pk=duplicate["first"]).delete()
+            recipe_ids.add(duplicate["recipe"])
+        Recipe.objects.filter(pk__in=recipe_ids).update(**{
+            counter: Coalesce(
+                Subquery(
+                    model.objects.filter(recipe=OuterRef("pk"))
+                    .order_by()
+                    .values("recipe")
+                    .annotate(count=Count("pk"))
+                    .values("count")
+                ),
+                0,
+            )
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipe", "0005_recipe_ordering"),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicates, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name="shoppingcart",
+            name="shoppingcart_user_recipe_idx",
+        ),
+        migrations.AddConstraint(
+            model_name="favorite",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_favorite"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="shoppingcart",
+            constraint=models.UniqueConstraint(
+                fields=("user", "recipe"), name="unique_shopping_cart"
+            ),
+        ),
+    ]
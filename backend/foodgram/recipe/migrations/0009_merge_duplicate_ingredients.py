@@ -0,0 +1,55 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:02
+
+from django.db import migrations
+from django.db.models import Count, Min, Sum
+
+# Предел PositiveSmallIntegerField на PostgreSQL.
+MAX_AMOUNT = 32767
+
+
+def merge_duplicates(apps, schema_editor):
+    """
+    Рецепты переводим на первый из одинаковых ингредиентов. Если в
+    рецепте было несколько дубликатов, их количества складываем в одну
+    строку: иначе перенос нарушил бы уникальность (recipe, ingredient).
+    """
+    Ingredient = apps.get_model("recipe", "Ingredient")
+    IngredientRecipe = apps.get_model("recipe", "IngredientRecipe")
+    duplicates = (
+        Ingredient.objects.values("name", "measurement_unit")
+        .annotate(first=Min("pk"), count=Count("pk"))
+        .filter(count__gt=1)
+    )
+    for duplicate in duplicates:
+        group = Ingredient.objects.filter(
+            name=duplicate["name"],
+            measurement_unit=duplicate["measurement_unit"],
+        )
+        rows = IngredientRecipe.objects.filter(ingredient__in=group)
+        collisions = (
+            rows.values("recipe_id")
+            .annotate(keep=Min("pk"), total=Sum("amount"), count=Count("pk"))
+            .filter(count__gt=1)
+        )
+        for collision in collisions:
+            IngredientRecipe.objects.filter(pk=collision["keep"]).update(
+                amount=min(collision["total"], MAX_AMOUNT)
+            )
+            rows.filter(recipe_id=collision["recipe_id"]).exclude(
+                pk=collision["keep"]
+            ).delete()
+        rows.exclude(ingredient_id=duplicate["first"]).update(
+            ingredient_id=duplicate["first"]
+        )
+        group.exclude(pk=duplicate["first"]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("recipe", "0008_recipe_image_variants"),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,43 @@
 from django.contrib.auth.models import AbstractUser
 from django.core import validators
-from django.db import models
-from django.db.models import CheckConstraint, F, Q, UniqueConstraint
+from django.db import connections, models, transaction
+from django.db.models import (CheckConstraint, Count, Exists, F, OuterRef,
+                              Prefetch, Q, Subquery, UniqueConstraint)
+from django.db.models.functions import Coalesce
+from django.dispatch import Signal
 
 from .validators import validate_hex
 
+# bulk_create и delete_returning не шлют post_save и post_delete: о
+# подписках, созданных и удалённых пачкой, сообщают эти сигналы
+# (pairs — пары (user_id, author_id)). Обработчики — в signals.py.
+follows_created = Signal()
+follows_deleted = Signal()
+
+
+def delete_returning(model, using, user, field, values):
+    """
+    DELETE ... RETURNING одним запросом: строки пользователя user со
+    значением поля field из values. Сигналов post_delete нет — ORM
+    ради них перед удалением читает строки. Возвращает значения field
+    удалённых строк.
+    """
+    if not values:
+        return []
+    connection = connections[using]
+    quote = connection.ops.quote_name
+    opts = model._meta
+    column = quote(opts.get_field(field).column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {quote(opts.db_table)} "
+            f"WHERE {quote(opts.get_field('user').column)} = %s "
+            f"AND {column} IN ({', '.join(['%s'] * len(values))}) "
+            f"RETURNING {column}",
+            [user.pk, *values],
+        )
+        return [value for value, in cursor.fetchall()]
+
 
 class User(AbstractUser):
     email = models.EmailField(max_length=254, unique=True, null=False,
@@ -23,6 +56,71 @@ class User(AbstractUser):
         return self.email
 
 
+class FollowQuerySet(models.QuerySet):
+    def with_recipes(self, limit=None):
+        """
+        Число рецептов автора и последние `limit` его рецептов
+        (в `author.recipes_preview`) одним запросом на всю страницу.
+        """
+        recipes = Recipe.objects.all()
+        if limit is not None:
+            recipes = recipes.filter(
+                pk__in=Subquery(
+                    Recipe.objects.filter(author=OuterRef("author"))
+                    .values("pk")[:limit]
+                )
+            )
+        return (
+            self.select_related("author")
+            .annotate(recipes_count=Count("author__recipe_user"))
+            .prefetch_related(
+                Prefetch("author__recipe_user", queryset=recipes,
+                         to_attr="recipes_preview")
+            )
+        )
+
+    def follow_many(self, user, author_ids):
+        """
+        Подписка сразу на несколько авторов: один SELECT и один
+        bulk_create(ignore_conflicts=True). Статус по каждому id:
+        followed, exists, self или not_found.
+        """
+        found = dict(
+            User.objects.filter(pk__in=author_ids).annotate(
+                present=Exists(self.filter(user=user, author=OuterRef("pk")))
+            ).order_by().values_list("pk", "present")
+        )
+        new_ids = [pk for pk, present in found.items()
+                   if not present and pk != user.pk]
+        with transaction.atomic(using=self.db):
+            self.bulk_create(
+                [self.model(user=user, author_id=pk) for pk in new_ids],
+                ignore_conflicts=True,
+            )
+            follows_created.send(sender=self.model,
+                                 pairs=[(user.pk, pk) for pk in new_ids])
+        return {
+            pk: ("self" if pk == user.pk
+                 else "not_found" if pk not in found
+                 else "exists" if found[pk] else "followed")
+            for pk in author_ids
+        }
+
+    def unfollow_many(self, user, author_ids):
+        """
+        Отписка сразу от нескольких авторов одним DELETE. Записи ленты
+        убирает обработчик follows_deleted. Статус по каждому id:
+        unfollowed или missing.
+        """
+        with transaction.atomic(using=self.db):
+            removed = set(delete_returning(self.model, self.db, user,
+                                           "author", author_ids))
+            follows_deleted.send(sender=self.model,
+                                 pairs=[(user.pk, pk) for pk in removed])
+        return {pk: "unfollowed" if pk in removed else "missing"
+                for pk in author_ids}
+
+
 class Follow(models.Model):
     author = models.ForeignKey(
         User,
@@ -37,6 +135,8 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         verbose_name = "Подписку"
         verbose_name_plural = "Подписки"
@@ -68,11 +168,149 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = "Ингридиент"
         verbose_name_plural = "Ингридиенты"
+        constraints = [
+            UniqueConstraint(fields=["name", "measurement_unit"],
+                             name="unique_ingredient"),
+        ]
 
     def __str__(self):
         return f"{self.name}, {self.measurement_unit}."
 
 
+def count_per_recipe(model):
+    """Подзапрос: сколько строк модели ссылается на рецепт."""
+    return Coalesce(
+        Subquery(
+            model.objects.filter(recipe=OuterRef("pk"))
+            .order_by()
+            .values("recipe")
+            .annotate(count=Count("pk"))
+            .values("count")
+        ),
+        0,
+    )
+
+
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """Автор, тэги и ингредиенты рецепта фиксированным числом запросов."""
+        return self.select_related("author").prefetch_related(
+            "tags",
+            Prefetch(
+                "recipe",
+                queryset=IngredientRecipe.objects.select_related(
+                    "ingredient"),
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """
+        Отметки «в избранном» и «в списке покупок» для пользователя
+        одним запросом на всю выборку.
+        """
+        if not user.is_authenticated:
+            return self
+        return self.annotate(
+            is_favorited=Exists(
+                Favorite.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+            is_in_shopping_cart=Exists(
+                ShoppingCart.objects.filter(user=user, recipe=OuterRef("pk"))
+            ),
+        )
+
+    def change_counter(self, field, delta):
+        """Атомарно меняет счётчик избранного или корзин."""
+        return self.update(**{field: F(field) + delta})
+
+    def update_counters(self):
+        """Пересчитывает счётчики избранного и корзин одним UPDATE."""
+        return self.update(
+            favorites_count=count_per_recipe(Favorite),
+            in_carts_count=count_per_recipe(ShoppingCart),
+        )
+
+
+class UserRecipeQuerySet(models.QuerySet):
+    """
+    Избранное и корзина: добавление и удаление одним запросом, без
+    предварительной проверки существования. Дубликаты отсекает
+    уникальное ограничение (user, recipe), поэтому повторный запрос
+    ничего не меняет. Счётчик рецепта из counter_field модели
+    меняется в той же транзакции. Сигналы эти методы не шлют;
+    остальные сохранения и удаления (админка, каскад при удалении
+    пользователя) пересчитывают счётчики в recipe/signals.py.
+    """
+
+    def add(self, user, recipe):
+        """INSERT ... ON CONFLICT DO NOTHING; True, если строка добавлена."""
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        opts = self.model._meta
+        user_column = quote(opts.get_field("user").column)
+        recipe_column = quote(opts.get_field("recipe").column)
+        with transaction.atomic(using=self.db):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {quote(opts.db_table)} "
+                    f"({user_column}, {recipe_column}) VALUES (%s, %s) "
+                    f"ON CONFLICT ({user_column}, {recipe_column}) "
+                    f"DO NOTHING",
+                    [user.pk, recipe.pk],
+                )
+                added = cursor.rowcount
+            if added:
+                Recipe.objects.filter(pk=recipe.pk).change_counter(
+                    self.model.counter_field, added)
+        return bool(added)
+
+    def remove(self, user, recipe_id):
+        """Один DELETE; True, если строка была."""
+        with transaction.atomic(using=self.db):
+            deleted = len(delete_returning(self.model, self.db, user,
+                                           "recipe", [recipe_id]))
+            if deleted:
+                Recipe.objects.filter(pk=recipe_id).change_counter(
+                    self.model.counter_field, -deleted)
+        return bool(deleted)
+
+    def add_many(self, user, recipe_ids):
+        """
+        Добавляет сразу несколько рецептов: один SELECT, один
+        bulk_create(ignore_conflicts=True) и пересчёт счётчиков.
+        Возвращает статус по каждому id: added, exists или not_found.
+        """
+        found = dict(
+            Recipe.objects.filter(pk__in=recipe_ids).annotate(
+                present=Exists(self.filter(user=user, recipe=OuterRef("pk")))
+            ).order_by().values_list("pk", "present")
+        )
+        new_ids = [pk for pk, present in found.items() if not present]
+        with transaction.atomic(using=self.db):
+            self.bulk_create(
+                [self.model(user=user, recipe_id=pk) for pk in new_ids],
+                ignore_conflicts=True,
+            )
+            Recipe.objects.filter(pk__in=new_ids).update_counters()
+        return {
+            pk: ("not_found" if pk not in found
+                 else "exists" if found[pk] else "added")
+            for pk in recipe_ids
+        }
+
+    def remove_many(self, user, recipe_ids):
+        """
+        Убирает сразу несколько рецептов одним DELETE и пересчитывает
+        их счётчики. Возвращает статус по каждому id: removed или missing.
+        """
+        with transaction.atomic(using=self.db):
+            removed = set(delete_returning(self.model, self.db, user,
+                                           "recipe", recipe_ids))
+            Recipe.objects.filter(pk__in=removed).update_counters()
+        return {pk: "removed" if pk in removed else "missing"
+                for pk in recipe_ids}
+
+
 class Recipe(models.Model):
     name = models.CharField("Название", max_length=256)
     author = models.ForeignKey(
@@ -84,6 +322,10 @@ class Recipe(models.Model):
     image = models.ImageField(
         "Изображение рецепта", upload_to="recipe/", blank=True, null=True
     )
+    image_variants = models.JSONField(
+        "Уменьшенные копии изображения", default=dict, blank=True,
+        editable=False,
+    )
     text = models.TextField("Описание")
     ingredients = models.ManyToManyField(
         Ingredient,
@@ -104,11 +346,28 @@ class Recipe(models.Model):
             ),
         ],
     )
+    created = models.DateTimeField("Дата публикации", auto_now_add=True)
+    favorites_count = models.PositiveIntegerField(
+        "В избранном", default=0, editable=False
+    )
+    in_carts_count = models.PositiveIntegerField(
+        "В корзинах", default=0, editable=False
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = "Рецепт"
         verbose_name_plural = "Рецепты"
         ordering = ("-id",)
+        indexes = [
+            models.Index(fields=["-created", "-id"],
+                         name="recipe_created_idx"),
+            models.Index(fields=["-favorites_count", "-id"],
+                         name="recipe_popularity_idx"),
+            models.Index(fields=["cooking_time", "id"],
+                         name="recipe_cooking_time_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -163,9 +422,16 @@ class Favorite(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+    counter_field = "favorites_count"
+
     class Meta:
         verbose_name = "Избранное"
         verbose_name_plural = "Избранные"
+        constraints = [
+            UniqueConstraint(fields=["user", "recipe"],
+                             name="unique_favorite"),
+        ]
 
     def __str__(self):
         return f"Рецепт {self.recipe} в избранного {self.user}"
@@ -185,9 +451,61 @@ class ShoppingCart(models.Model):
         on_delete=models.CASCADE,
     )
 
+    objects = UserRecipeQuerySet.as_manager()
+    counter_field = "in_carts_count"
+
     class Meta:
         verbose_name = "Корзина"
         verbose_name_plural = "Корзины"
+        constraints = [
+            UniqueConstraint(fields=["user", "recipe"],
+                             name="unique_shopping_cart"),
+        ]
 
     def __str__(self):
         return f"Рецепт {self.recipe} в корзине {self.user}"
+
+
+class FeedItem(models.Model):
+    """
+    Рецепт в ленте подписчика. Строки создаются при публикации рецепта
+    (fan-out on write), поэтому лента читается по индексу без JOIN
+    подписок и рецептов. created и author копируются из рецепта.
+    """
+
+    user = models.ForeignKey(
+        User,
+        verbose_name="Подписчик",
+        related_name="feed",
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        verbose_name="Рецепт",
+        related_name="feed_items",
+        on_delete=models.CASCADE,
+    )
+    author = models.ForeignKey(
+        User,
+        verbose_name="Автор",
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    created = models.DateTimeField("Дата публикации")
+
+    class Meta:
+        verbose_name = "Запись ленты"
+        verbose_name_plural = "Ленты"
+        constraints = [
+            UniqueConstraint(fields=["user", "recipe"],
+                             name="unique_feed_item"),
+        ]
+        indexes = [
+            models.Index(fields=["user", "-created", "-recipe"],
+                         name="feeditem_user_created_idx"),
+            models.Index(fields=["user", "author"],
+                         name="feeditem_user_author_idx"),
+        ]
+
+    def __str__(self):
+        return f"Рецепт {self.recipe} в ленте {self.user}"
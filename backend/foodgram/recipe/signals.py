@@ -0,0 +1,105 @@
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import feed, images
+from .models import (Favorite, Follow, Ingredient, IngredientRecipe, Recipe,
+                     ShoppingCart, Tag, User, follows_created,
+                     follows_deleted)
+from .versions import (INGREDIENTS, RECIPES, TAGS, bump_version_on_commit,
+                       recipe_version)
+
+
+@receiver([post_save, post_delete], sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version_on_commit(INGREDIENTS)
+
+
+@receiver([post_save, post_delete], sender=Tag)
+def tag_changed(**kwargs):
+    bump_version_on_commit(TAGS)
+
+
+@receiver([post_save, post_delete], sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    bump_version_on_commit(RECIPES, recipe_version(instance.pk))
+
+
+@receiver([post_save, post_delete], sender=IngredientRecipe)
+def recipe_ingredient_changed(instance, **kwargs):
+    bump_version_on_commit(RECIPES, recipe_version(instance.recipe_id))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_changed(instance, action, pk_set, reverse, **kwargs):
+    if not action.startswith("post_"):
+        return
+    if reverse:
+        bump_version_on_commit(RECIPES, TAGS)
+    else:
+        bump_version_on_commit(RECIPES, recipe_version(instance.pk))
+
+
+@receiver(post_save, sender=User)
+def author_changed(instance, created, update_fields, **kwargs):
+    if created or (update_fields is not None
+                   and set(update_fields) <= {"last_login"}):
+        return
+    recipes = instance.recipe_user.values_list("pk", flat=True)
+    bump_version_on_commit(RECIPES, *(recipe_version(pk) for pk in recipes))
+
+
+@receiver(pre_save, sender=Favorite)
+@receiver(pre_save, sender=ShoppingCart)
+def user_recipe_saving(sender, instance, **kwargs):
+    """Запоминаем прежний рецепт: в админке строку можно перенести."""
+    instance.previous_recipe_id = (
+        sender.objects.filter(pk=instance.pk)
+        .values_list("recipe_id", flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver([post_save, post_delete], sender=Favorite)
+@receiver([post_save, post_delete], sender=ShoppingCart)
+def user_recipe_changed(instance, **kwargs):
+    """
+    Счётчики избранного и корзин при сохранении и удалении по одной
+    строке: админка, каскад при удалении пользователя. API их меняет
+    само через UserRecipeQuerySet, без сигналов.
+    """
+    recipes = {instance.recipe_id,
+               getattr(instance, "previous_recipe_id", None)} - {None}
+    Recipe.objects.filter(pk__in=recipes).update_counters()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_published(instance, created, **kwargs):
+    if created:
+        feed.schedule_fan_out(instance)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, **kwargs):
+    images.schedule_variants(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(instance, created, **kwargs):
+    if created:
+        feed.backfill([(instance.user_id, instance.author_id)])
+
+
+@receiver(follows_created, sender=Follow)
+def follows_bulk_created(pairs, **kwargs):
+    feed.backfill(pairs)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(instance, **kwargs):
+    feed.remove([(instance.user_id, instance.author_id)])
+
+
+@receiver(follows_deleted, sender=Follow)
+def follows_bulk_deleted(pairs, **kwargs):
+    feed.remove(pairs)
@@ -0,0 +1,272 @@
+import json
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from . import feed
+from .models import (FeedItem, Favorite, Follow, Ingredient, Recipe,
+                     ShoppingCart, User)
+
+
+class CounterTests(TestCase):
+    """favorites_count и in_carts_count при любом способе изменения строк."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="author@example.com", username="author", password="x")
+        cls.reader = User.objects.create_user(
+            email="reader@example.com", username="reader", password="x")
+        cls.recipe, cls.other = (
+            Recipe.objects.create(name=name, text="Описание",
+                                  cooking_time=10, author=cls.author,
+                                  image="recipe/test.png")
+            for name in ("Рецепт", "Другой рецепт")
+        )
+
+    def assert_counters(self, recipe, favorites, carts):
+        recipe.refresh_from_db()
+        self.assertEqual(
+            (recipe.favorites_count, recipe.in_carts_count),
+            (favorites, carts))
+
+    def test_api_add_and_remove(self):
+        for model in (Favorite, ShoppingCart):
+            model.objects.add(self.reader, self.recipe)
+            model.objects.add(self.reader, self.recipe)
+        self.assert_counters(self.recipe, 1, 1)
+        for model in (Favorite, ShoppingCart):
+            self.assertTrue(model.objects.remove(self.reader, self.recipe.pk))
+            self.assertFalse(
+                model.objects.remove(self.reader, self.recipe.pk))
+        self.assert_counters(self.recipe, 0, 0)
+
+    def test_instance_save_and_delete(self):
+        favorite = Favorite.objects.create(user=self.reader,
+                                           recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.reader, recipe=self.recipe)
+        self.assert_counters(self.recipe, 1, 1)
+        favorite.recipe = self.other
+        favorite.save()
+        self.assert_counters(self.recipe, 0, 1)
+        self.assert_counters(self.other, 1, 0)
+        favorite.delete()
+        self.assert_counters(self.other, 0, 0)
+
+    def test_user_delete_cascade(self):
+        for model in (Favorite, ShoppingCart):
+            model.objects.add(self.reader, self.recipe)
+        self.reader.delete()
+        self.assert_counters(self.recipe, 0, 0)
+
+
+class FollowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, *cls.authors = (
+            User.objects.create_user(email=f"user{index}@example.com",
+                                     username=f"user{index}", password="x")
+            for index in range(4)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(name="Рецепт", text="Описание", cooking_time=10,
+                   author=author, image="recipe/test.png")
+            for author in cls.authors
+        )
+
+    def test_follow_and_unfollow_many(self):
+        author_ids = [author.pk for author in self.authors]
+        Follow.objects.follow_many(self.reader, author_ids)
+        self.assertEqual(FeedItem.objects.filter(user=self.reader).count(), 3)
+        # SAVEPOINT, DELETE подписок, DELETE ленты, RELEASE SAVEPOINT.
+        with self.assertNumQueries(4):
+            statuses = Follow.objects.unfollow_many(
+                self.reader, author_ids[:2] + [0])
+        self.assertEqual(statuses, {author_ids[0]: "unfollowed",
+                                    author_ids[1]: "unfollowed",
+                                    0: "missing"})
+        self.assertEqual(
+            list(FeedItem.objects.filter(user=self.reader)
+                 .values_list("author_id", flat=True)),
+            author_ids[2:])
+
+    def test_import_counts_existing_as_skipped(self):
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        with tempfile.NamedTemporaryFile("w", suffix=".csv") as file:
+            file.write("user,author\n")
+            for author in self.authors:
+                file.write(f"{self.reader.pk},{author.pk}\n")
+            file.write(f"{self.reader.pk},{self.reader.pk}\n")
+            file.flush()
+            out = StringIO()
+            call_command("import_follows", file.name, stdout=out)
+        self.assertIn("Прочитано: 4", out.getvalue())
+        self.assertIn("уже существующие): 2,", out.getvalue())
+        self.assertEqual(Follow.objects.filter(user=self.reader).count(), 3)
+        self.assertEqual(FeedItem.objects.filter(user=self.reader).count(), 3)
+
+    def test_import_skips_malformed_rows(self):
+        author = self.authors[0].pk
+        lines = [
+            f'{{"user": {self.reader.pk}, "author": {author}}}',
+            "{не json",
+            f'{{"user": {self.reader.pk}}}',
+            f"[{self.reader.pk}, {author}]",
+            '"строка"',
+            f'{{"user": {self.reader.pk}, "author": null}}',
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as file:
+            file.write("\n".join(lines))
+            file.flush()
+            out = StringIO()
+            call_command("import_follows", file.name, stdout=out)
+        self.assertIn("Прочитано: 6", out.getvalue())
+        self.assertIn("уже существующие): 5,", out.getvalue())
+        self.assertEqual(
+            list(Follow.objects.values_list("user_id", "author_id")),
+            [(self.reader.pk, author)])
+
+
+class LoadIngredientsTests(TestCase):
+    def test_json_skips_non_objects(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".json") as file:
+            file.write('[{"name": "Salt", "measurement_unit": "g"}, '
+                       '"Pepper", 5, null, true, '
+                       '{"name": "Sugar", "measurement_unit": "g"}]')
+            file.flush()
+            out = StringIO()
+            call_command("load_ingrs", file.name, stdout=out)
+        self.assertIn("Добавлено: 2,", out.getvalue())
+        self.assertIn("повторы): 4.", out.getvalue())
+        self.assertEqual(
+            set(Ingredient.objects.values_list("name", flat=True)),
+            {"Salt", "Sugar"})
+
+
+class ImportRecipesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(
+            email="author@example.com", username="author", password="x")
+        Ingredient.objects.create(name="Salt", measurement_unit="g")
+
+    def record(self, name, cooking_time=10, amount=1):
+        return {
+            "name": name, "text": "Описание", "cooking_time": cooking_time,
+            "author": self.author.email, "tags": [],
+            "ingredients": [{"name": "Salt", "measurement_unit": "g",
+                             "amount": amount}],
+        }
+
+    def test_out_of_range_records_are_skipped(self):
+        records = [
+            self.record("First"),
+            self.record("Too long", cooking_time=32768),
+            self.record("Zero time", cooking_time=0),
+            self.record("Too much", amount=40000),
+            self.record("No salt", amount=0),
+            self.record("Last", cooking_time=32767, amount=32767),
+        ]
+        with tempfile.NamedTemporaryFile("w", suffix=".jsonl") as file:
+            file.write("\n".join(json.dumps(record) for record in records))
+            file.flush()
+            out = StringIO()
+            call_command("import_recipes", file.name, "--skip-images",
+                         stdout=out)
+        self.assertIn("Добавлено: 2, пропущено: 4,", out.getvalue())
+        self.assertEqual(
+            set(Recipe.objects.values_list("name", flat=True)),
+            {"First", "Last"})
+
+
+class FeedTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader, cls.author = (
+            User.objects.create_user(email=f"{name}@example.com",
+                                     username=name, password="x")
+            for name in ("reader", "author")
+        )
+
+    def create_recipe(self, name="Рецепт"):
+        return Recipe.objects.create(name=name, text="Описание",
+                                     cooking_time=10, author=self.author)
+
+    def test_fan_out_runs_in_executor(self):
+        with mock.patch.object(feed, "get_executor") as get_executor:
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe = self.create_recipe()
+        get_executor.return_value.submit.assert_called_once_with(
+            feed.process, recipe)
+
+    @override_settings(FEED_MAX_LENGTH=10)
+    def test_backfill_takes_newest_recipes(self):
+        # 11 рецептов укладываются в запас trim: лишний не должен попасть
+        # в ленту уже при вставке.
+        recipes = [self.create_recipe(f"Рецепт {index}")
+                   for index in range(11)]
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(
+            set(FeedItem.objects.filter(user=self.reader)
+                .values_list("recipe_id", flat=True)),
+            {recipe.pk for recipe in recipes[1:]})
+
+
+class MergeDuplicateIngredientsTests(TransactionTestCase):
+    """Миграции 0009–0010 на базе, где рецепт ссылается на два дубликата."""
+
+    before = [("recipe", "0008_recipe_image_variants")]
+    after = [("recipe", "0010_unique_ingredient")]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.loader.build_graph()
+        executor.migrate(targets)
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def test_amounts_are_merged(self):
+        apps = self.migrate(self.before)
+        models = {name: apps.get_model("recipe", name)
+                  for name in ("User", "Ingredient", "Recipe",
+                               "IngredientRecipe")}
+        author = models["User"].objects.create(
+            email="author@example.com", username="author")
+        salt, salt_copy, pepper = (
+            models["Ingredient"].objects.create(name=name,
+                                                measurement_unit="г")
+            for name in ("соль", "соль", "перец")
+        )
+        both, one = (
+            models["Recipe"].objects.create(
+                name=name, text="Описание", cooking_time=10, author=author)
+            for name in ("Оба дубликата", "Один дубликат")
+        )
+        models["IngredientRecipe"].objects.bulk_create([
+            models["IngredientRecipe"](recipe=both, ingredient=salt,
+                                       amount=5),
+            models["IngredientRecipe"](recipe=both, ingredient=salt_copy,
+                                       amount=7),
+            models["IngredientRecipe"](recipe=both, ingredient=pepper,
+                                       amount=1),
+            models["IngredientRecipe"](recipe=one, ingredient=salt_copy,
+                                       amount=3),
+        ])
+
+        apps = self.migrate(self.after)
+        IngredientRecipe = apps.get_model("recipe", "IngredientRecipe")
+        self.assertEqual(
+            apps.get_model("recipe", "Ingredient").objects.filter(
+                name="соль").count(), 1)
+        self.assertEqual(
+            set(IngredientRecipe.objects.values_list(
+                "recipe_id", "ingredient_id", "amount")),
+            {(both.pk, salt.pk, 12), (both.pk, pepper.pk, 1),
+             (one.pk, salt.pk, 3)})
@@ -0,0 +1,53 @@
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+INGREDIENTS = "ingredients"
+RECIPES = "recipes"
+TAGS = "tags"
+
+
+def get_key(name):
+    return f"version:{name}"
+
+
+def recipe_version(pk):
+    return f"{RECIPES}:{pk}"
+
+
+def get_versions(*names):
+    """
+    Текущие версии наборов данных. Хранятся в кэше, поэтому общие для
+    всех процессов при общем бэкенде кэша. Начальное значение берётся
+    из времени, чтобы после сброса кэша версии не повторялись.
+    """
+    keys = [get_key(name) for name in names]
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    for key in missing:
+        cache.add(key, time.time_ns(), None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return tuple(versions.get(key, time.time_ns()) for key in keys)
+
+
+def get_version(name):
+    return get_versions(name)[0]
+
+
+def bump_version(*names):
+    """Отмечает, что наборы данных изменились."""
+    for name in names:
+        try:
+            cache.incr(get_key(name))
+        except ValueError:
+            cache.set(get_key(name), time.time_ns(), None)
+
+
+def bump_version_on_commit(*names):
+    """
+    Меняет версии после коммита, чтобы параллельный запрос не положил
+    в кэш ещё старые данные под новой версией.
+    """
+    transaction.on_commit(lambda: bump_version(*names))